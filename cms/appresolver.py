@@ -4,20 +4,68 @@ from importlib import import_module
 from django.core.exceptions import ImproperlyConfigured
 from django.db import OperationalError, ProgrammingError
 from django.urls import NoReverseMatch, Resolver404, URLResolver, reverse
-from django.urls.resolvers import RegexPattern, URLPattern
+from django.urls.resolvers import RegexPattern, URLPattern, get_ns_resolver, get_resolver
 from django.utils.translation import get_language, override
 
 from cms.apphook_pool import apphook_pool
 from cms.models.pagemodel import Page
 from cms.utils import get_current_site
+from cms.utils.conf import get_cms_setting
 from cms.utils.i18n import get_language_list
 
 APP_RESOLVERS = []
 
+# Index of APP_RESOLVERS by language and page url path, see get_app_resolvers()
+_app_resolver_index = {}
+
 
 def clear_app_resolvers():
     global APP_RESOLVERS
     APP_RESOLVERS = []
+    _app_resolver_index.clear()
+
+
+def _get_app_resolver_index(language):
+    resolvers = APP_RESOLVERS
+    entry = _app_resolver_index.get(language)
+
+    if entry is None or entry[0] is not resolvers:
+        index = {}
+
+        for resolver in resolvers:
+            path = resolver.page_paths.get(language)
+
+            if path is not None:
+                index.setdefault(path, []).append(resolver)
+        entry = (resolvers, index)
+        _app_resolver_index[language] = entry
+    return entry[1]
+
+
+def get_app_resolvers(path):
+    """
+    Returns the app resolvers able to resolve the «path» in the current
+    language: those of the pages whose url path is a prefix of «path», the
+    longest first, since the patterns of an apphook are prefixed with the
+    path of its page.
+    """
+    index = _get_app_resolver_index(get_language())
+    prefixes = [path[:position] for position, char in enumerate(path) if char == '/']
+    prefixes.reverse()
+    prefixes.append('')
+    return [resolver for prefix in prefixes for resolver in index.get(prefix, ())]
+
+
+def _get_app_page(page_id):
+    if get_cms_setting('PAGE_ROUTE_TABLE'):
+        from cms.cache.routes import get_page_by_id_from_route_table
+
+        return get_page_by_id_from_route_table(get_current_site(), page_id)
+
+    try:
+        return Page.objects.get(id=page_id)
+    except Page.DoesNotExist:
+        return None
 
 
 def applications_page_check(request):
@@ -36,15 +84,17 @@ def applications_page_check(request):
         if path.startswith(lang + "/"):
             path = path[len(lang + "/"):]
 
-    for resolver in APP_RESOLVERS:
+    for resolver in get_app_resolvers(path):
         try:
             page_id = resolver.resolve_page_id(path)
-            return Page.objects.get(id=page_id)
         except Resolver404:
             # Raised if the page is not managed by an apphook
-            pass
-        except Page.DoesNotExist:
-            pass
+            continue
+
+        page = _get_app_page(page_id)
+
+        if page is not None:
+            return page
     return None
 
 
@@ -52,6 +102,10 @@ class AppRegexURLResolver(URLResolver):
     def __init__(self, *args, **kwargs):
         self.page_id = None
         self.url_patterns_dict = {}
+        # The page, apphook and urls the resolver was built for
+        self.signature = None
+        # The url paths of the page by language
+        self.page_paths = {}
         super().__init__(*args, **kwargs)
 
     @property
@@ -214,10 +268,23 @@ def _get_app_patterns(site):
     If the app is still configured, but is no longer installed/available, then
     this method returns a degenerate patterns object: patterns('')
     """
+    app_patterns = _build_app_resolvers(site)
+    APP_RESOLVERS.extend(app_patterns)
+    _app_resolver_index.clear()
+    return app_patterns
+
+
+def _build_app_resolvers(site, resolvers=()):
+    """
+    Builds the app resolvers of the pages of the «site» with an apphook.
+    The resolvers of «resolvers» whose page, apphook and urls are unchanged
+    are reused as they are, instead of being built again.
+    """
     from cms.models.pagemodel import PageUrl
 
     included = []
     hooked_applications = OrderedDict()
+    reusable = {resolver.page_id: resolver for resolver in resolvers}
 
     # we don't have a request here so get_page_queryset() can't be used,
     # so use public() queryset.
@@ -246,28 +313,98 @@ def _get_app_patterns(site):
         app = apphook_pool.get_apphook(page_url.page.application_urls)
         if not app:
             continue
-        if page_url.page_id not in hooked_applications:
-            hooked_applications[page_url.page_id] = {}
-        app_ns = app.app_name, page_url.page.application_namespace
-        with override(page_url.language):
-            hooked_applications[page_url.page_id][page_url.language] = (
-                app_ns, get_patterns_for_page_url(page_url), app)
+        hooked_applications.setdefault(page_url.page_id, []).append((page_url, app))
         included.append(mix_id)
         # Build the app patterns to be included in the cms urlconfs
     app_patterns = []
-    for page_id in hooked_applications.keys():
-        resolver = None
-        for lang in hooked_applications[page_id].keys():
-            (app_ns, inst_ns), current_patterns, app = hooked_applications[page_id][lang]  # nopyflakes
-            if not resolver:
-                regex_pattern = RegexPattern(r'')
-                resolver = AppRegexURLResolver(
-                    regex_pattern, 'app_resolver', app_name=app_ns, namespace=inst_ns)
-                resolver.page_id = page_id
-            if app.permissions:
-                _set_permissions(current_patterns, app.exclude_permissions)
-
-            resolver.url_patterns_dict[lang] = current_patterns
+    for page_id, hooked_urls in hooked_applications.items():
+        page, app = hooked_urls[0][0].page, hooked_urls[0][1]
+        signature = (
+            app,
+            page.application_urls,
+            page.application_namespace,
+            tuple((page_url.language, page_url.path) for page_url, _ in hooked_urls),
+        )
+        resolver = reusable.get(page_id)
+
+        if resolver is None or resolver.signature != signature:
+            resolver = _build_app_resolver(page_id, hooked_urls)
+            resolver.signature = signature
         app_patterns.append(resolver)
-        APP_RESOLVERS.append(resolver)
     return app_patterns
+
+
+def _build_app_resolver(page_id, hooked_urls):
+    resolver = None
+    for page_url, app in hooked_urls:
+        if not resolver:
+            app_ns, inst_ns = app.app_name, page_url.page.application_namespace
+            regex_pattern = RegexPattern(r'')
+            resolver = AppRegexURLResolver(
+                regex_pattern, 'app_resolver', app_name=app_ns, namespace=inst_ns)
+            resolver.page_id = page_id
+        with override(page_url.language):
+            current_patterns = get_patterns_for_page_url(page_url)
+        if app.permissions:
+            _set_permissions(current_patterns, app.exclude_permissions)
+
+        resolver.url_patterns_dict[page_url.language] = current_patterns
+        resolver.page_paths[page_url.language] = page_url.path
+    return resolver
+
+
+def _reset_resolver_caches(resolver, patterns):
+    """
+    Resets the reverse caches of «resolver» and of the resolvers it includes,
+    as far as they include the list «patterns». The caches of the resolvers
+    of other url patterns are left as they are.
+    Returns whether «resolver» includes «patterns».
+    """
+    includes = resolver.url_patterns is patterns
+
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver) and not isinstance(pattern, AppRegexURLResolver):
+            includes = _reset_resolver_caches(pattern, patterns) or includes
+
+    if includes:
+        resolver._reverse_dict = {}
+        resolver._namespace_dict = {}
+        resolver._app_dict = {}
+        resolver._callback_strs = set()
+        resolver._populated = False
+    return includes
+
+
+def swap_app_resolvers():
+    """
+    Rebuilds the app resolvers of the cms urlconf without reloading any
+    module, see CMS_APPHOOK_INCREMENTAL_RELOAD.
+
+    Only the resolvers of the pages whose apphook or urls changed are built
+    again. The app resolvers of the cms urlconf are then replaced in a single
+    assignment, so that concurrent requests use either the previous or the
+    new ones, and only the reverse caches of the resolvers including the cms
+    urlconf are reset.
+    """
+    global APP_RESOLVERS
+
+    urlpatterns = import_module('cms.urls').urlpatterns
+    current = []
+
+    for pattern in urlpatterns:
+        if not isinstance(pattern, AppRegexURLResolver):
+            break
+        current.append(pattern)
+
+    try:
+        resolvers = _build_app_resolvers(get_current_site(), resolvers=current)
+    except (OperationalError, ProgrammingError):
+        # ignore if DB is not ready
+        return
+
+    urlpatterns[:len(current)] = resolvers
+    APP_RESOLVERS = resolvers
+    _app_resolver_index.clear()
+    _reset_resolver_caches(get_resolver(), urlpatterns)
+    # Namespaced resolvers are built from the app resolvers
+    get_ns_resolver.cache_clear()
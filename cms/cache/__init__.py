@@ -1,4 +1,5 @@
 import re
+import time
 
 from cms.utils.conf import get_cms_setting
 
@@ -36,7 +37,10 @@ def _set_cache_version(version):
 
 def invalidate_cms_page_cache():
     """
-    Invalidates the CMS PAGE CACHE.
+    Invalidates the CMS PAGE CACHE for all pages on all sites.
+
+    Use invalidate_cms_page_cache_dependencies() to only invalidate the pages
+    depending on a given page, placeholder or menu.
     """
 
     #
@@ -70,6 +74,54 @@ def invalidate_cms_page_cache():
     _set_cache_version(version + 1)
 
 
+def _get_dependency_key(dependency):
+    """
+    Returns the cache key holding the version of the given page cache
+    «dependency», a («kind», «pk») tuple such as ("placeholder", 12).
+    """
+    kind, pk = dependency
+    return f'{get_cms_setting("CACHE_PREFIX")}|page_cache_dependency|{kind}:{pk}'
+
+
+def _get_dependency_versions(dependencies):
+    """
+    Returns a dict mapping the cache key of each of the given «dependencies»
+    to its current version. Dependencies without a version in the cache get a
+    fresh one.
+    """
+    from django.core.cache import cache
+
+    keys = [_get_dependency_key(dependency) for dependency in dependencies]
+    versions = cache.get_many(keys)
+    missing = {key: int(time.time() * 1000000) for key in keys if key not in versions}
+
+    if missing:
+        # Dependency versions live as long as the content cache entries
+        # written against them. Should a version expire before an entry
+        # depending on it, the entry is considered invalid on read.
+        cache.set_many(missing, get_cms_setting('CACHE_DURATIONS')['content'])
+        versions.update(missing)
+    return versions
+
+
+def invalidate_cms_page_cache_dependencies(dependencies):
+    """
+    Invalidates the CMS PAGE CACHE entries depending on any of the given
+    «dependencies», leaving all other cached pages untouched.
+
+    Each dependency is a («kind», «pk») tuple. The page cache tracks
+    ("page", page.pk), ("placeholder", placeholder.pk) and
+    ("menu", site_id) dependencies.
+    """
+    from django.core.cache import cache
+
+    version = int(time.time() * 1000000)
+    cache.set_many(
+        {_get_dependency_key(dependency): version for dependency in dependencies},
+        get_cms_setting('CACHE_DURATIONS')['content'],
+    )
+
+
 CLEAN_KEY_PATTERN = re.compile(r'[^a-zA-Z0-9_-]')
 
 
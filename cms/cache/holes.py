@@ -0,0 +1,208 @@
+"""
+This module manages the optional "holes" punched into cached pages.
+
+A plugin with ``cache = False`` normally prevents the whole page from being
+cached. With ``CMS_PAGE_CACHE_HOLES`` enabled, such plugins are not rendered
+along with the page for anonymous visitors. A hole is left in their place
+instead, which is filled for each request:
+
+* ``"inline"``: the hole is an HTML comment, which is replaced by the
+  rendered plugin once the page has been rendered or fetched from the page
+  cache. The page is still marked as uncacheable for downstream caches.
+* ``"esi"``: the hole is an ``<esi:include>`` tag pointing to the plugin
+  fragment endpoint, to be filled by an ESI-capable proxy (e.g. Varnish).
+
+Holes are only punched when rendering a CMS page (see render_page()), so
+that placeholders rendered elsewhere are never served with holes. In both
+modes, holes carry a signed token naming their plugin, its placeholder and
+the page, so content that merely looks like a hole (e.g. the text of a
+plugin) never renders a plugin. Tokens expire along with the cached pages
+holding them, and are only rendered for visitors who may view the page, as
+long as the plugin is still in the placeholder and the page is published.
+
+Plugins rendered in a hole don't share the context of the page, so what they
+add to sekizai blocks is lost.
+"""
+import re
+
+from django.core import signing
+from django.template import RequestContext, Template
+from django.urls import reverse
+from django.utils.cache import add_never_cache_headers
+from django.utils.html import format_html
+from django.utils.translation import override
+
+from cms.utils.conf import get_cms_setting
+
+PLUGIN_HOLE_MARKER = '<!-- cms-plugin-hole:{token} -->'
+
+PLUGIN_HOLE_RE = re.compile(r'<!-- cms-plugin-hole:([\w:-]+) -->')
+
+PLUGIN_HOLE_SALT = 'cms.cache.holes'
+
+
+def enable_plugin_holes(request):
+    """
+    Enables punching holes for the uncacheable plugins of the page rendered
+    for the request, if the page may be cached.
+    """
+    mode = get_cms_setting('PAGE_CACHE_HOLES')
+
+    if mode and get_cms_setting('PAGE_CACHE') and not request.user.is_authenticated:
+        request._cms_plugin_holes = mode
+
+
+def get_plugin_holes_mode(request):
+    """
+    Returns the mode in which holes are punched for the request, if any.
+    """
+    return getattr(request, '_cms_plugin_holes', None)
+
+
+def is_plugin_hole(request, instance, plugin, placeholder):
+    """
+    Returns True if the plugin is to be left out of the page as a hole.
+    """
+    if not get_plugin_holes_mode(request):
+        return False
+    return not plugin.cache and not plugin.get_cache_expiration(request, instance, placeholder)
+
+
+def get_plugin_hole_max_age():
+    """
+    Returns the number of seconds the token of a hole is valid for: as long
+    as the page holding it may be served from the page cache.
+    """
+    return get_cms_setting('CACHE_DURATIONS')['content'] + get_cms_setting('PAGE_CACHE_STALE_WHILE_REVALIDATE')
+
+
+def get_plugin_hole(request, instance):
+    """
+    Returns the markup standing in for the plugin «instance».
+    """
+    page = getattr(request, 'current_page', None)
+    value = f'{instance.pk}:{instance.placeholder_id}:{page.pk if page else 0}'
+    token = signing.TimestampSigner(salt=PLUGIN_HOLE_SALT).sign(value)
+
+    if get_plugin_holes_mode(request) == 'esi':
+        return format_html('<esi:include src="{}" />', reverse('cms_plugin_fragment', args=(token,)))
+    return PLUGIN_HOLE_MARKER.format(token=token)
+
+
+def get_plugin_hole_ids(token):
+    """
+    Returns the (plugin pk, placeholder pk, page pk) tuple from the token of
+    a hole, or None if the token has been tampered with or has expired.
+    """
+    try:
+        value = signing.TimestampSigner(salt=PLUGIN_HOLE_SALT).unsign(token, max_age=get_plugin_hole_max_age())
+        plugin_id, placeholder_id, page_id = map(int, value.split(':'))
+    except (signing.BadSignature, ValueError):
+        return None
+    return plugin_id, placeholder_id, page_id
+
+
+def _can_render_plugin_hole(request, page_id, language):
+    """
+    Returns True if the page the hole was punched in is published in the
+    language and may be viewed by the user of the request.
+    """
+    from cms.models import Page, PageContent
+    from cms.utils.page_permissions import user_can_view_page
+
+    try:
+        page = Page.objects.select_related('site').get(pk=page_id)
+    except Page.DoesNotExist:
+        return False
+
+    if page.login_required and not request.user.is_authenticated:
+        return False
+
+    if not PageContent.objects.filter(page=page, language=language).exists():
+        return False
+    return user_can_view_page(request.user, page, site=page.site)
+
+
+def render_plugin_hole(request, plugin_id, placeholder_id, page_id):
+    """
+    Renders the plugin with the given pk, along with its children, or returns
+    None if it's no longer in the placeholder or the page may not be viewed.
+    """
+    from cms.models import CMSPlugin
+    from cms.utils.plugins import downcast_plugins, get_plugins_as_layered_tree
+
+    try:
+        root = CMSPlugin.objects.select_related('placeholder').get(pk=plugin_id, placeholder_id=placeholder_id)
+    except CMSPlugin.DoesNotExist:
+        return None
+
+    if not _can_render_plugin_hole(request, page_id, root.language):
+        return None
+
+    plugins = [root, *root.get_descendants().order_by('position')]
+    plugins = list(downcast_plugins(plugins, [root.placeholder], request=request))
+    get_plugins_as_layered_tree(plugins)
+    instance = next((plugin for plugin in plugins if plugin.pk == root.pk), None)
+
+    if instance is None:
+        # Plugin not available
+        return ''
+
+    template = Template('{% load cms_tags %}{% render_plugin plugin %}')
+    mode = get_plugin_holes_mode(request)
+    # The plugin is to be rendered this time
+    request._cms_plugin_holes = None
+
+    try:
+        with override(instance.language):
+            return template.render(RequestContext(request, {'plugin': instance}))
+    finally:
+        request._cms_plugin_holes = mode
+
+
+def has_plugin_holes(response):
+    """
+    Returns True if the response has holes to be filled by fill_plugin_holes().
+    """
+    return (
+        get_cms_setting('PAGE_CACHE_HOLES') == 'inline'
+        and not response.streaming
+        and PLUGIN_HOLE_RE.search(response.content.decode(response.charset)) is not None
+    )
+
+
+def fill_plugin_holes(request, response):
+    """
+    Fills the holes of the response with the rendered plugins.
+    The response is made uncacheable downstream if it had any.
+    """
+    mode = get_cms_setting('PAGE_CACHE_HOLES')
+
+    if not mode or response.streaming:
+        return response
+
+    if mode == 'esi':
+        if b'<esi:include' in response.content:
+            # Tells surrogates to process the ESI tags
+            response['Surrogate-Control'] = 'content="ESI/1.0"'
+        return response
+
+    content = response.content.decode(response.charset)
+    hole_ids = {token: get_plugin_hole_ids(token) for token in set(PLUGIN_HOLE_RE.findall(content))}
+
+    if not hole_ids:
+        return response
+
+    rendered = {ids: render_plugin_hole(request, *ids) or '' for ids in sorted(set(hole_ids.values()) - {None})}
+
+    def fill(match):
+        ids = hole_ids[match.group(1)]
+        # Markers with an invalid or expired signature are left as they are
+        return rendered[ids] if ids is not None else match.group(0)
+
+    response.content = PLUGIN_HOLE_RE.sub(fill, content)
+
+    if response.has_header('Content-Length'):
+        response['Content-Length'] = str(len(response.content))
+    add_never_cache_headers(response)
+    return response
@@ -0,0 +1,155 @@
+"""
+This module manages the optional materialized placeholders.
+
+When ``CMS_MATERIALIZED_PLACEHOLDERS`` is enabled, a placeholder is rendered
+once, for an anonymous visitor, every time one of its plugins is saved or
+deleted (see cms.signals.placeholders) and the result is stored in the cache
+for the content cache duration. The content renderer serves it to non-staff visitors without
+loading any plugins, so the cost of rendering the placeholder no longer
+depends on the number of plugins it contains.
+
+Placeholders with plugins that cannot be cached, that vary on request headers
+or that define their own expiration are never materialized. The entries are
+removed whenever the placeholder cache is cleared and can be rebuilt in bulk
+with ``manage.py cms materialize-placeholders``.
+"""
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sites.models import Site
+from django.http import HttpRequest
+from django.utils import timezone
+from django.utils.translation import override
+
+from cms.constants import MAX_EXPIRATION_TTL
+from cms.utils.conf import get_cms_setting, get_site_id
+from cms.utils.helpers import get_timezone_name
+
+
+def _get_materialized_placeholder_key(placeholder, lang, site_id):
+    """
+    Returns the cache key of the materialized «placeholder» for «lang» and
+    «site_id», rendered in the current time zone.
+    """
+    prefix = get_cms_setting('CACHE_PREFIX')
+    tz = get_timezone_name()
+    return f'{prefix}|materialized_placeholder|id:{placeholder.pk}|lang:{lang}|site:{site_id}|tz:{tz}'
+
+
+def _get_anonymous_request(placeholder, lang, site):
+    """
+    Returns a GET request of an anonymous visitor of the page the
+    «placeholder» belongs to, if any.
+    """
+    page = placeholder.page
+    request = HttpRequest()
+    request.method = 'GET'
+
+    with override(lang):
+        path = page.get_absolute_url(lang) if page else None
+    request.path = request.path_info = path or f'/{lang}/'
+    request.META['SERVER_NAME'] = site.domain.split(':')[0]
+    request.META['SERVER_PORT'] = '80'
+    request.current_page = page
+    request.user = AnonymousUser()
+    return request
+
+
+def _is_materializable(placeholder, request):
+    """
+    Returns True if the content of the (already rendered) «placeholder» is the
+    same for every visitor and does not expire.
+    """
+    if not placeholder.cache_placeholder or placeholder.get_vary_cache_on(request):
+        return False
+    return placeholder.get_cache_expiration(request, timezone.now()) >= MAX_EXPIRATION_TTL
+
+
+def render_materialized_placeholder(placeholder, lang, site_id=None):
+    """
+    Renders the «placeholder» for an anonymous visitor and returns a dict of
+    its content and sekizai data, or None if the placeholder can't be
+    materialized.
+    """
+    from sekizai.context import SekizaiContext
+    from sekizai.helpers import Watcher
+
+    from cms.models import Placeholder
+    from cms.plugin_rendering import ContentRenderer
+
+    # Start from a fresh instance, the given one might have
+    # outdated plugins attached to it.
+    placeholder = Placeholder.objects.get(pk=placeholder.pk)
+    site = Site.objects.get(pk=get_site_id(site_id))
+    request = _get_anonymous_request(placeholder, lang, site)
+    renderer = ContentRenderer(request)
+    context = SekizaiContext({'request': request, 'cms_content_renderer': renderer})
+    watcher = Watcher(context)
+
+    with override(lang):
+        content = renderer.render_placeholder(
+            placeholder,
+            context=context,
+            language=lang,
+            page=placeholder.page,
+            editable=False,
+        )
+
+    if not _is_materializable(placeholder, request):
+        return None
+    return {
+        'content': str(content),
+        'sekizai': watcher.get_changes(),
+    }
+
+
+def materialize_placeholder(placeholder, lang, site_id=None):
+    """
+    (Re-)builds the materialized content of the «placeholder» for «lang».
+    Returns True if the placeholder was materialized.
+
+    The placeholder is always rendered in the default time zone.
+    """
+    from django.core.cache import cache
+
+    if site_id is None and placeholder.page:
+        site_id = placeholder.page.site_id
+    site_id = get_site_id(site_id)
+
+    with timezone.override(None):
+        value = render_materialized_placeholder(placeholder, lang, site_id)
+        key = _get_materialized_placeholder_key(placeholder, lang, site_id)
+
+    if value is None:
+        cache.delete(key)
+        return False
+    cache.set(key, value, get_cms_setting('CACHE_DURATIONS')['content'])
+    return True
+
+
+def get_materialized_placeholders(placeholders, lang, site_id):
+    """
+    Returns a dict mapping the pk of each of the given «placeholders» that
+    has been materialized to its content and sekizai data, with a single
+    cache round-trip.
+    """
+    from django.core.cache import cache
+
+    keys = {
+        _get_materialized_placeholder_key(placeholder, lang, site_id): placeholder
+        for placeholder in placeholders
+    }
+
+    if not keys:
+        return {}
+    return {keys[key].pk: value for key, value in cache.get_many(list(keys)).items()}
+
+
+def clear_materialized_placeholder(placeholder, lang, site_id):
+    """
+    Removes the materialized content of (placeholder x lang x site_id) so that
+    it is rendered normally until it's materialized again.
+    """
+    from django.core.cache import cache
+
+    with timezone.override(None):
+        key = _get_materialized_placeholder_key(placeholder, lang, site_id)
+    cache.delete(key)
@@ -1,28 +1,59 @@
 import hashlib
+import re
+from collections import Counter
 from datetime import timedelta
 
 from django.conf import settings
+from django.http import HttpResponse
 from django.utils.cache import (
     add_never_cache_headers,
+    get_conditional_response,
+    patch_cache_control,
     patch_response_headers,
     patch_vary_headers,
+    set_response_etag,
 )
 from django.utils.encoding import iri_to_uri
+from django.utils.http import http_date, parse_http_date_safe
+from django.utils.text import compress_string
 from django.utils.timezone import now
 
-from cms.cache import _get_cache_key, _get_cache_version, _set_cache_version
+from cms.cache import (
+    CMS_PAGE_CACHE_VERSION_KEY,
+    _get_cache_key,
+    _get_cache_version,
+    _get_dependency_versions,
+    _set_cache_version,
+)
+from cms.cache.holes import fill_plugin_holes, has_plugin_holes
 from cms.constants import EXPIRE_NOW, MAX_EXPIRATION_TTL
 from cms.toolbar.utils import get_toolbar_from_request
 from cms.utils.compat.response import get_response_headers
 from cms.utils.conf import get_cms_setting
 from cms.utils.helpers import get_timezone_name
 
+try:
+    # brotli is not guaranteed to be available
+    import brotli
+except ImportError:
+    brotli = None
+
+# Per-process counters of page cache lookups by outcome:
+# "hit", "stale" (served while another worker re-renders) and "miss".
+page_cache_stats = Counter()
+
+
+# Part of the cache keys, to be bumped whenever the layout of the cached
+# entries changes, so that entries written by earlier releases are never read.
+PAGE_CACHE_ENTRY_FORMAT = 'f5'
+
 
 def _page_cache_key(request):
     # sha1 key of current path
-    cache_key = "%s:%d:%s" % (
+    cache_key = "%s:%d:%s:%s" % (
         get_cms_setting("CACHE_PREFIX"),
         settings.SITE_ID,
+        PAGE_CACHE_ENTRY_FORMAT,
         hashlib.sha1(iri_to_uri(request.get_full_path()).encode('utf-8')).hexdigest()
     )
     if settings.USE_TZ:
@@ -30,6 +61,99 @@ def _page_cache_key(request):
     return cache_key
 
 
+def _get_page_cache_dependencies(request, placeholders):
+    """
+    Returns the list of («kind», «pk») dependencies of the page rendered
+    for «request». Any change to one of these invalidates the cached response.
+    """
+    dependencies = [('menu', settings.SITE_ID)]
+    page = getattr(request, 'current_page', None)
+
+    if page:
+        dependencies.append(('page', page.pk))
+    # Static placeholders are covered by the public placeholder they render.
+    dependencies.extend(('placeholder', placeholder.pk) for placeholder in placeholders)
+    return dependencies
+
+
+def _get_encoded_content(response):
+    """
+    Returns a dict mapping content codings to the response content
+    compressed once, ahead of serving it from the cache.
+    """
+    content = response.content
+
+    # Compressing tiny responses does not pay off
+    if len(content) < 200 or response.has_header('Content-Encoding'):
+        return {}
+
+    encoded_content = {'gzip': compress_string(content)}
+
+    if brotli:
+        encoded_content['br'] = brotli.compress(content)
+    # Keep only the codings that actually make the content smaller
+    return {coding: data for coding, data in encoded_content.items() if len(data) < len(content)}
+
+
+ACCEPT_ENCODING_RE = re.compile(r'\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?')
+
+
+def _get_accepted_encodings(request):
+    """
+    Returns the content codings accepted by the client,
+    ignoring the ones explicitly refused with q=0.
+    """
+    accepted = set()
+
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        match = ACCEPT_ENCODING_RE.match(part)
+
+        if not match:
+            continue
+
+        coding, quality = match.groups()
+
+        try:
+            refused = quality is not None and float(quality) == 0
+        except ValueError:
+            refused = False
+
+        if not refused:
+            accepted.add(coding.lower())
+    return accepted
+
+
+def _page_cache_lock_key(request):
+    return _page_cache_key(request) + '.lock'
+
+
+def _acquire_page_cache_lock(request):
+    """
+    Tries to become the single worker re-rendering the requested page.
+    The lock is released once the response went through set_page_cache()
+    or, should the worker fail, after the stale-while-revalidate window.
+    """
+    from django.core.cache import cache
+
+    lock_key = _page_cache_lock_key(request)
+    grace = get_cms_setting('PAGE_CACHE_STALE_WHILE_REVALIDATE')
+
+    if cache.add(lock_key, True, grace):
+        request._cms_page_cache_lock = lock_key
+        return True
+    return False
+
+
+def _release_page_cache_lock(request):
+    from django.core.cache import cache
+
+    lock_key = getattr(request, '_cms_page_cache_lock', None)
+
+    if lock_key:
+        cache.delete(lock_key)
+        del request._cms_page_cache_lock
+
+
 def set_page_cache(response):
     from django.core.cache import cache
 
@@ -39,6 +163,7 @@ def set_page_cache(response):
 
     if is_authenticated or toolbar._cache_disabled or not get_cms_setting("PAGE_CACHE"):
         add_never_cache_headers(response)
+        _release_page_cache_lock(request)
         return response
 
     # This *must* be TZ-aware
@@ -75,30 +200,155 @@ def set_page_cache(response):
             # Adds expiration, etc. to headers
             patch_response_headers(response, cache_timeout=ttl)
             patch_vary_headers(response, sorted(vary_cache_on_set))
+            # Validators are computed once here and stored along with the
+            # content, so cache hits can answer conditional requests.
+            # Responses with holes differ for each request.
+            has_holes = has_plugin_holes(response)
+
+            if not response.has_header('ETag') and not has_holes:
+                set_response_etag(response)
+            if not response.has_header('Last-Modified') and not has_holes:
+                response['Last-Modified'] = http_date(timestamp.timestamp())
+
+            if get_cms_setting('PAGE_CACHE_COMPRESS') and not has_holes:
+                encoded_content = _get_encoded_content(response)
+            else:
+                encoded_content = {}
+
+            if encoded_content:
+                patch_vary_headers(response, ('Accept-Encoding',))
 
             version = _get_cache_version()
             # We also store the absolute expiration timestamp to avoid
             # recomputing it on cache-reads.
             expires_datetime = timestamp + timedelta(seconds=ttl)
             response_headers = get_response_headers(response)
+            dependencies = _get_dependency_versions(
+                _get_page_cache_dependencies(request, placeholders)
+            )
+            # The global version is checked like any other dependency, which
+            # allows serving the entry while stale after a cache flush.
+            dependencies[CMS_PAGE_CACHE_VERSION_KEY] = version
+            # Stale entries are kept for the stale-while-revalidate window.
+            grace = get_cms_setting('PAGE_CACHE_STALE_WHILE_REVALIDATE')
             cache.set(
                 _page_cache_key(request),
                 (
                     response.content,
                     response_headers,
                     expires_datetime,
+                    dependencies,
+                    encoded_content,
                 ),
-                ttl,
-                version=version
+                ttl + grace,
             )
             # See note in invalidate_cms_page_cache()
             _set_cache_version(version)
+    _release_page_cache_lock(request)
     return response
 
 
-def get_page_cache(request):
+def _get_page_cache_entry(request):
+    """
+    Returns the cached («content», «headers», «expires_datetime»,
+    «encoded_content») for the request, or None if there's no entry or any of
+    the objects the entry depends on has been invalidated since it was written.
+
+    With CMS_PAGE_CACHE_STALE_WHILE_REVALIDATE set, an outdated entry is
+    still returned while one single worker re-renders the page.
+    """
     from django.core.cache import cache
-    return cache.get(_page_cache_key(request), version=_get_cache_version())
+
+    cached = cache.get(_page_cache_key(request))
+
+    if cached is None:
+        page_cache_stats['miss'] += 1
+        return None
+
+    content, headers, expires_datetime, dependencies, encoded_content = cached
+    current_versions = cache.get_many(list(dependencies))
+    is_fresh = expires_datetime > now() and all(
+        current_versions.get(key) == version for key, version in dependencies.items()
+    )
+
+    if is_fresh:
+        page_cache_stats['hit'] += 1
+        return content, headers, expires_datetime, encoded_content
+
+    if get_cms_setting('PAGE_CACHE_STALE_WHILE_REVALIDATE') and not _acquire_page_cache_lock(request):
+        # Another worker is already re-rendering this page.
+        # Stale content expires right away for downstream caches.
+        page_cache_stats['stale'] += 1
+        return content, headers, min(expires_datetime, now()), encoded_content
+
+    page_cache_stats['miss'] += 1
+    return None
+
+
+def get_page_cache(request):
+    """
+    Returns the cached («content», «headers», «expires_datetime») for the
+    request, or None if the page is not cached.
+    """
+    cached = _get_page_cache_entry(request)
+
+    if cached is None:
+        return None
+    return cached[:3]
+
+
+def get_page_cache_response(request):
+    """
+    Returns the response for the request built from the page cache,
+    or None if the page is not cached. Conditional requests matching the
+    cached ETag or Last-Modified get a 304 Not Modified response.
+
+    Pre-compressed content is served to clients accepting its coding,
+    preferring brotli over gzip.
+
+    The page cache is looked up at most once per request, so a request missing
+    the cache in FetchFromPageCacheMiddleware is rendered by the details view.
+    """
+    if getattr(request, '_cms_page_cache_checked', False):
+        return None
+
+    request._cms_page_cache_checked = True
+    cache_content = _get_page_cache_entry(request)
+
+    if cache_content is None:
+        return None
+
+    content, headers, expires_datetime, encoded_content = cache_content
+    accepted_encodings = _get_accepted_encodings(request) if encoded_content else set()
+    coding = next(
+        (coding for coding in ('br', 'gzip') if coding in encoded_content and coding in accepted_encodings),
+        None,
+    )
+
+    response = HttpResponse(encoded_content[coding] if coding else content)
+    response.xframe_options_exempt = True
+    response.headers = headers
+
+    if coding:
+        response.headers['Content-Encoding'] = coding
+        response.headers['Content-Length'] = str(len(response.content))
+        etag = response.get('ETag')
+        # The encoded content is not byte-for-byte the same
+        # as the one the strong ETag was computed from.
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+    # Recalculate the max-age header for this cached response,
+    # stale responses must not be cached downstream.
+    max_age = max(int((expires_datetime - now()).total_seconds() + 0.5), 0)
+    patch_cache_control(response, max_age=max_age)
+    response = fill_plugin_holes(request, response)
+    # Answers If-None-Match / If-Modified-Since with a 304
+    return get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=parse_http_date_safe(response.get('Last-Modified')),
+        response=response,
+    )
 
 
 def get_xframe_cache(page):
@@ -118,15 +368,22 @@ def _page_url_key(page_lookup, lang, site_id):
     return _get_cache_key('page_url', page_lookup, lang, site_id) + '_type:absolute_url'
 
 
+def _page_url_version(site_id):
+    # Page urls change along with the site's page tree,
+    # so they're invalidated together with the site's menu.
+    [menu_version] = _get_dependency_versions([('menu', site_id)]).values()
+    return f'{_get_cache_version()}.{menu_version}'
+
+
 def set_page_url_cache(page_lookup, lang, site_id, url):
     from django.core.cache import cache
     cache.set(_page_url_key(page_lookup, lang, site_id),
               url,
-              get_cms_setting('CACHE_DURATIONS')['content'], version=_get_cache_version())
+              get_cms_setting('CACHE_DURATIONS')['content'], version=_page_url_version(site_id))
     _set_cache_version(_get_cache_version())
 
 
 def get_page_url_cache(page_lookup, lang, site_id):
     from django.core.cache import cache
     return cache.get(_page_url_key(page_lookup, lang, site_id),
-                     version=_get_cache_version())
+                     version=_page_url_version(site_id))
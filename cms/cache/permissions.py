@@ -3,7 +3,11 @@ from cms.utils.conf import get_cms_setting
 PERMISSION_KEYS = [
     'add_page', 'change_page', 'change_page_advanced_settings',
     'change_page_permissions', 'delete_page', 'move_page',
-    'publish_page', 'view_page',
+    'publish_page', 'view_page', 'view_page_fingerprint',
+    # Compiled permission indexes, see cms.models.PermissionIndex
+    'add_page_index', 'change_page_index', 'change_page_advanced_settings_index',
+    'change_page_permissions_index', 'delete_page_index', 'move_page_index',
+    'publish_page_index', 'view_page_index',
 ]
 
 
@@ -15,12 +15,16 @@ the current HTTPRequest object.
 
 The vary-on header-names are also stored with the version. This enables us to
 check for cache hits without re-computing placeholder.get_vary_cache_on().
+
+All placeholders of a page are read at once with get_placeholders_cache(),
+which fetches all versions, then all contents, with one cache.get_many() each.
 """
 import hashlib
 import time
 
 from django.utils.timezone import now
 
+from cms.cache.holes import get_plugin_holes_mode
 from cms.utils.conf import get_cms_setting
 from cms.utils.helpers import get_header_name, get_timezone_name
 
@@ -94,10 +98,7 @@ def _get_placeholder_cache_key(placeholder, lang, site_id, request, soft=False):
     read from the cache. If instead the key retrieval is to support a cache
     write, let «soft» be False.
     """
-    prefix = get_cms_setting('CACHE_PREFIX')
     version, vary_on_list = _get_placeholder_cache_version(placeholder, lang, site_id)
-    tz = get_timezone_name()
-    main_key = f"{prefix}|render_placeholder|id:{placeholder.pk}|lang:{lang}|site:{site_id}|tz:{tz}|v:{version}"
 
     if not soft:
         # We are about to write to the cache, so we want to get the latest
@@ -111,6 +112,25 @@ def _get_placeholder_cache_key(placeholder, lang, site_id, request, soft=False):
         _set_placeholder_cache_version(
             placeholder, lang, site_id, version, vary_on_list, duration)
 
+    return _format_placeholder_cache_key(
+        placeholder, lang, site_id, request, version=version, vary_on_list=vary_on_list)
+
+
+def _format_placeholder_cache_key(placeholder, lang, site_id, request, *, version, vary_on_list):
+    """
+    Returns the fully-addressed cache key for the given placeholder and
+    the request, given the placeholder's current «version» and vary-on
+    header-names list.
+    """
+    prefix = get_cms_setting('CACHE_PREFIX')
+    tz = get_timezone_name()
+    main_key = f"{prefix}|render_placeholder|id:{placeholder.pk}|lang:{lang}|site:{site_id}|tz:{tz}|v:{version}"
+    holes_mode = get_plugin_holes_mode(request)
+
+    if holes_mode:
+        # Content with holes is only valid where the holes get filled
+        main_key += f'|holes:{holes_mode}'
+
     sub_key_list = []
     for key in vary_on_list:
         value = request.META.get(get_header_name(key)) or '_'
@@ -141,18 +161,23 @@ def set_placeholder_cache(placeholder, lang, site_id, content, request):
     """
     from django.core.cache import cache
 
-    key = _get_placeholder_cache_key(placeholder, lang, site_id, request)
-
+    version, _ = _get_placeholder_cache_version(placeholder, lang, site_id)
+    # We are about to write to the cache, so we want to get the latest
+    # vary_cache_on headers and the correct cache expiration, ignoring any
+    # we already have. The placeholder has already been rendered, so this is
+    # very efficient (zero-additional queries) due to the caching of all its
+    # plugins during the rendering process anyway.
+    vary_on_list = placeholder.get_vary_cache_on(request)
     duration = min(
         get_cms_setting('CACHE_DURATIONS')['content'],
         placeholder.get_cache_expiration(request, now())
     )
-    cache.set(key, content, duration)
-    # "touch" the cache-version, so that it stays as fresh as this content.
-    version, vary_on_list = _get_placeholder_cache_version(placeholder, lang, site_id)
-    _set_placeholder_cache_version(
-        placeholder, lang, site_id, version, vary_on_list, duration=duration
-    )
+    key = _format_placeholder_cache_key(
+        placeholder, lang, site_id, request, version=version, vary_on_list=vary_on_list)
+    version_key = _get_placeholder_cache_version_key(placeholder, lang, site_id)
+    # Writes the content and "touches" the cache-version in one go,
+    # so that the version stays as fresh as this content.
+    cache.set_many({key: content, version_key: (version, vary_on_list)}, duration)
 
 
 def get_placeholder_cache(placeholder, lang, site_id, request):
@@ -167,6 +192,36 @@ def get_placeholder_cache(placeholder, lang, site_id, request):
     return content
 
 
+def get_placeholders_cache(placeholders, lang, site_id, request):
+    """
+    Returns a dict mapping the pk of each of the given «placeholders» found in
+    the cache to its cached content, respecting the placeholders' VARY headers.
+
+    Costs two cache round-trips regardless of the number of placeholders:
+    one for all versions and one for all contents.
+    """
+    from django.core.cache import cache
+
+    version_keys = {
+        _get_placeholder_cache_version_key(placeholder, lang, site_id): placeholder
+        for placeholder in placeholders
+    }
+    versions = cache.get_many(list(version_keys))
+    content_keys = {}
+
+    for version_key, (version, vary_on_list) in versions.items():
+        placeholder = version_keys[version_key]
+        key = _format_placeholder_cache_key(
+            placeholder, lang, site_id, request, version=version, vary_on_list=vary_on_list)
+        content_keys[key] = placeholder
+
+    if not content_keys:
+        return {}
+
+    cached_content = cache.get_many(list(content_keys))
+    return {content_keys[key].pk: content for key, content in cached_content.items()}
+
+
 def clear_placeholder_cache(placeholder, lang, site_id):
     """
     Invalidates all existing cache entries for (placeholder x lang x site_id).
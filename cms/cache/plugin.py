@@ -0,0 +1,129 @@
+"""
+This module manages the optional per-plugin fragment cache.
+
+A rendered plugin is cached under a key made of its pk, its changed_date and
+the pk and changed_date of all its descendants (in tree order), along with the
+language, site, time zone and the values of the request headers the plugins
+vary on. Changing, adding, moving or deleting any plugin of the sub-tree
+results in a new key.
+
+The key also holds the version of the placeholder cache of the plugin's
+placeholder and the global CMS cache version, so that clearing the cache of
+the placeholder (e.g. with Page.clear_cache(placeholder=True)) or calling
+invalidate_cms_page_cache() flushes the fragments of plugins rendering
+related objects. Outdated entries simply expire.
+"""
+import hashlib
+
+from cms.utils.conf import get_cms_setting
+from cms.utils.helpers import get_header_name, get_timezone_name
+
+
+def _get_plugin_tree_info(instance, placeholder, request):
+    """
+    Returns whether the sub-tree of the given plugin instance can be cached,
+    a hash of the pk and changed_date of its plugins and the set of request
+    headers they vary on.
+
+    The result is kept on the instance for the request and built from the
+    results of its children, so each plugin of a placeholder is only looked
+    at once.
+    """
+    cached_request, info = getattr(instance, '_cms_fragment_cache_info', (None, None))
+
+    if cached_request is request:
+        return info
+
+    plugin = instance.get_plugin_class_instance()
+    cacheable = bool(plugin.cache) and plugin.get_cache_expiration(request, instance, placeholder) is None
+    vary_on = plugin.get_vary_cache_on(request, instance, placeholder)
+    vary_on_set = {vary_on} if isinstance(vary_on, str) else set(vary_on or [])
+    tree = [f'{instance.pk}:{instance.changed_date.isoformat()}']
+
+    for child in instance.child_plugin_instances or []:
+        child_cacheable, child_tree, child_vary_on_set = _get_plugin_tree_info(child, placeholder, request)
+        cacheable = cacheable and child_cacheable
+        tree.append(child_tree)
+        vary_on_set |= child_vary_on_set
+
+    info = (cacheable, hashlib.sha1('|'.join(tree).encode('utf-8')).hexdigest(), frozenset(vary_on_set))
+    instance._cms_fragment_cache_info = (request, info)
+    return info
+
+
+def is_plugin_cacheable(instance, placeholder, request):
+    """
+    Returns True if neither the plugin nor any of its descendants opted out
+    of caching, either with ``cache = False`` or with a custom
+    get_cache_expiration().
+    """
+    return _get_plugin_tree_info(instance, placeholder, request)[0]
+
+
+def _get_cache_versions(placeholder, lang, site_id, request):
+    """
+    Returns the placeholder cache version of (placeholder x lang x site_id)
+    and the global CMS cache version, read once per request.
+    """
+    from cms.cache import _get_cache_version
+    from cms.cache.placeholder import _get_placeholder_cache_version
+
+    versions = request.__dict__.setdefault('_cms_fragment_cache_versions', {})
+    key = (placeholder.pk, lang, site_id)
+
+    if key not in versions:
+        placeholder_version, _ = _get_placeholder_cache_version(placeholder, lang, site_id)
+        versions[key] = f'{placeholder_version}.{_get_cache_version()}'
+    return versions[key]
+
+
+def _get_plugin_cache_key(instance, placeholder, site_id, request):
+    """
+    Returns the fully-addressed cache key for the given plugin and the request.
+    """
+    cached_request, cache_key = getattr(instance, '_cms_fragment_cache_key', (None, None))
+
+    if cached_request is request:
+        return cache_key
+
+    prefix = get_cms_setting('CACHE_PREFIX')
+    _, tree, vary_on_set = _get_plugin_tree_info(instance, placeholder, request)
+    sub_key_list = [
+        key + ':' + (request.META.get(get_header_name(key)) or '_')
+        for key in sorted(vary_on_set)
+    ]
+    key = '|'.join([
+        f'lang:{instance.language}',
+        f'site:{site_id}',
+        f'tz:{get_timezone_name()}',
+        f'version:{_get_cache_versions(placeholder, instance.language, site_id, request)}',
+        f'tree:{tree}',
+    ] + sub_key_list)
+    cache_key = '{prefix}|render_plugin|id:{pk}|{hash}'.format(
+        prefix=prefix,
+        pk=instance.pk,
+        hash=hashlib.sha1(key.encode('utf-8')).hexdigest(),
+    )
+    instance._cms_fragment_cache_key = (request, cache_key)
+    return cache_key
+
+
+def set_plugin_cache(instance, placeholder, site_id, content, request):
+    """
+    Sets the cache of the given plugin with its rendered content.
+    """
+    from django.core.cache import cache
+
+    key = _get_plugin_cache_key(instance, placeholder, site_id, request)
+    cache.set(key, content, get_cms_setting('CACHE_DURATIONS')['content'])
+
+
+def get_plugin_cache(instance, placeholder, site_id, request):
+    """
+    Returns the rendered content of the given plugin from cache
+    respecting the plugin's VARY headers.
+    """
+    from django.core.cache import cache
+
+    key = _get_plugin_cache_key(instance, placeholder, site_id, request)
+    return cache.get(key)
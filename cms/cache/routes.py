@@ -0,0 +1,195 @@
+"""
+This module manages the optional in-process page route table.
+
+When ``CMS_PAGE_ROUTE_TABLE`` is enabled, the pages of a site are resolved
+from a table mapping their url paths to their rows, along with the rows of
+their urls and contents, loaded in bulk once per process. Pages are rebuilt
+from these rows for each request, with their urls and contents prefetched,
+so resolving the page of a request costs no query. The same goes for the
+pages of the apphooks, looked up by id (see cms.appresolver).
+
+Each process checks the generation of the tables, a single key in the cache,
+on every lookup. The generation is bumped whenever a page, page url or page
+content is saved or deleted, a page is moved or the menus are cleared (see
+cms.signals), after which the tables are loaded again. It's bumped once more
+when the transaction is committed, since other processes might have loaded
+their tables from the rows as they were before. Tables are also loaded again
+once older than the ``menus`` duration of CMS_CACHE_DURATIONS.
+"""
+import time
+from collections import defaultdict
+from threading import local
+
+from django.db import router, transaction
+
+from cms.utils.conf import get_cms_setting
+
+# Per-process route tables by site id, each along with its generation and
+# the time it was loaded at
+_route_tables = {}
+
+# Set while the generation is to be bumped once the current transaction is
+# committed, see invalidate_page_routes()
+_pending = local()
+
+
+def _get_route_generation_key():
+    prefix = get_cms_setting('CACHE_PREFIX')
+    return f'{prefix}page_routes_generation'
+
+
+def _get_field_names(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def get_route_generation():
+    """
+    Returns the current generation of the route tables, shared by all
+    processes through the cache.
+    """
+    from django.core.cache import cache
+
+    key = _get_route_generation_key()
+    generation = cache.get(key)
+
+    if generation is None:
+        generation = int(time.time() * 1000000)
+        cache.set(key, generation, None)
+    return generation
+
+
+def invalidate_page_routes(**kwargs):
+    """
+    Makes all processes load their route tables again. Does nothing unless
+    CMS_PAGE_ROUTE_TABLE is enabled.
+    """
+    if not get_cms_setting('PAGE_ROUTE_TABLE'):
+        return
+
+    # Bumped right away for the queries of the current transaction
+    _set_route_generation()
+    _pending.invalidated = True
+    # The first callback run bumps the generation for all the changes
+    transaction.on_commit(_invalidate_pending_routes)
+
+
+def _set_route_generation():
+    from django.core.cache import cache
+
+    cache.set(_get_route_generation_key(), int(time.time() * 1000000), None)
+
+
+def _invalidate_pending_routes():
+    if _pending.__dict__.pop('invalidated', False):
+        _set_route_generation()
+
+
+def load_route_table(site):
+    """
+    Loads the rows of the pages of the «site», along with the rows of their
+    urls and contents, and returns them indexed by page id and url path.
+    """
+    from cms.models import Page, PageContent, PageUrl
+
+    url_fields = _get_field_names(PageUrl)
+    path_index = url_fields.index('path')
+    page_id_index = url_fields.index('page_id')
+    table = {
+        'paths': defaultdict(list),
+        'pages': {},
+        'urls': defaultdict(list),
+        'contents': defaultdict(list),
+    }
+
+    for row in PageUrl.objects.get_for_site(site).order_by('pk').values_list(*url_fields):
+        table['paths'][row[path_index]].append(row)
+        table['urls'][row[page_id_index]].append(row)
+
+    for row in Page.objects.filter(site=site).values_list(*_get_field_names(Page)):
+        table['pages'][row[0]] = row
+
+    content_fields = _get_field_names(PageContent)
+    content_page_id_index = content_fields.index('page_id')
+
+    for row in PageContent._default_manager.filter(page__site=site).values_list(*content_fields):
+        table['contents'][row[content_page_id_index]].append(row)
+    return table
+
+
+def get_route_table(site):
+    """
+    Returns the route table of the «site», loading it if outdated.
+    """
+    generation = get_route_generation()
+    entry = _route_tables.get(site.pk)
+    now = time.monotonic()
+
+    if entry is None or entry[0] != generation or now - entry[1] > get_cms_setting('CACHE_DURATIONS')['menus']:
+        entry = (generation, now, load_route_table(site))
+        _route_tables[site.pk] = entry
+    return entry[2]
+
+
+def _get_prefetched_queryset(manager, objects):
+    queryset = manager.all()
+    queryset._result_cache = objects
+    queryset._prefetch_done = True
+    return queryset
+
+
+def _build_page(table, page_id):
+    from cms.models import Page, PageContent, PageUrl
+
+    db = router.db_for_read(Page)
+    page = Page.from_db(db, _get_field_names(Page), table['pages'][page_id])
+
+    url_fields = _get_field_names(PageUrl)
+    page_urls = [PageUrl.from_db(db, url_fields, row) for row in table['urls'][page.pk]]
+    content_fields = _get_field_names(PageContent)
+    page_contents = [PageContent.from_db(db, content_fields, row) for row in table['contents'][page.pk]]
+
+    for obj in page_urls + page_contents:
+        obj.page = page
+
+    page._prefetched_objects_cache = {
+        'urls': _get_prefetched_queryset(page.urls, page_urls),
+        'pagecontent_set': _get_prefetched_queryset(page.pagecontent_set, page_contents),
+    }
+    return page
+
+
+def get_page_from_route_table(site, path):
+    """
+    Returns the page of the «site» the url «path» points to, or None, as
+    cms.utils.page.get_page_from_request() does, without any query.
+    The urls and contents of the page are prefetched.
+    """
+    from cms.models import Page, PageUrl
+
+    table = get_route_table(site)
+    url_rows = table['paths'].get(path)
+
+    if not url_rows:
+        return None
+
+    db = router.db_for_read(Page)
+    urls = [PageUrl.from_db(db, _get_field_names(PageUrl), row) for row in url_rows]
+    page = _build_page(table, urls[0].page_id)
+
+    for url in urls:
+        if url.page_id == page.pk:
+            url.page = page
+    page.urls_cache = {url.language: url for url in urls}
+    return page
+
+
+def get_page_by_id_from_route_table(site, page_id):
+    """
+    Returns the page of the «site» with the id «page_id», or None, without
+    any query. The urls and contents of the page are prefetched.
+    """
+    table = get_route_table(site)
+
+    if page_id not in table['pages']:
+        return None
+    return _build_page(table, page_id)
@@ -1,15 +1,26 @@
 import re
 from collections import defaultdict
-from typing import Generator, Iterable, Optional, Union
+from typing import Any, Generator, Iterable, Optional, Union
 
+from django.db.models import Q
+from django.urls import NoReverseMatch, reverse
 from django.utils.functional import SimpleLazyObject
 
 from cms import constants
 from cms.apphook_pool import apphook_pool
-from cms.models import Page, PageContent, PagePermission, PageUrl
+from cms.models import (
+    MASK_CHILDREN,
+    MASK_DESCENDANTS,
+    MASK_PAGE,
+    Page,
+    PageContent,
+    PagePermission,
+    PageUrl,
+)
 from cms.toolbar.utils import get_object_preview_url, get_toolbar_from_request
 from cms.utils.conf import get_cms_setting
 from cms.utils.i18n import (
+    force_language,
     get_fallback_languages,
     get_public_languages,
     hide_untranslated,
@@ -23,6 +34,12 @@ from menus.menu_pool import menu_pool
 VISIBLE_FOR_AUTHENTICATED = constants.VISIBILITY_ALL, constants.VISIBILITY_USERS
 VISIBLE_FOR_ANONYMOUS = constants.VISIBILITY_ALL, constants.VISIBILITY_ANONYMOUS
 
+# Stands for the path of the pages in the url pattern reversed once per
+# language to build their urls, see CMSMenu.get_page_url().
+PAGE_PATH_MARKER = "cms-page-path"
+
+PAGE_PATH_RE = re.compile(constants.SLUG_REGEXP)
+
 
 def get_visible_nodes(request, pages, site):
     """This function is deprecated. Use get_visible_page_contents instead."""
@@ -80,27 +97,58 @@ def get_visible_page_contents(request, page_contents: Iterable[PageContent], sit
         # only if he can see unrestricted, otherwise return no pages.
         return page_contents if can_see_unrestricted else []
 
+    page_contents = list(page_contents)
+    pages_by_id = {page_content.page.pk: page_content.page for page_content in page_contents}
     restrictions = PagePermission.objects.filter(
-        page_id__in={page_content.page.pk for page_content in page_contents},
+        page_id__in=pages_by_id,
         can_view=True,
-    )
-    restriction_map = {perm.page_id: perm for perm in restrictions}
+    ).values_list("page_id", "grant_on", "user_id", "group_id")
 
     user_id = request.user.pk
     user_groups = SimpleLazyObject(lambda: frozenset(request.user.groups.values_list("pk", flat=True)))
     is_auth_user = request.user.is_authenticated
 
-    def user_can_see_page(page: Page) -> bool:
-        if page.pk in restriction_map:
-            # set internal fk cache to our page with loaded ancestors and descendants
-            PagePermission.page.field.set_cached_value(restriction_map[page.pk], page)
+    # Compile the view restrictions into an index of the paths of the
+    # restricted pages. Each entry holds the union of the grant_on modes of
+    # all restrictions of the page and of those granting access to the user.
+    restriction_index = defaultdict(lambda: [0, 0])
+
+    for page_id, grant_on, perm_user_id, perm_group_id in restrictions:
+        entry = restriction_index[pages_by_id[page_id].path]
+        entry[0] |= grant_on
 
+        if is_auth_user and (perm_user_id == user_id or perm_group_id in user_groups):
+            entry[1] |= grant_on
+
+    if not restriction_index:
+        return page_contents if can_see_unrestricted else []
+
+    steplen = Page.steplen
+
+    def user_can_see_page(page: Page) -> bool:
+        depth = len(page.path) // steplen
         restricted = False
-        for perm in restrictions:
-            if perm.get_page_permission_tuple().contains(page.path):
+
+        # Look up the restrictions of the page and its ancestors
+        for level in range(1, depth + 1):
+            entry = restriction_index.get(page.path[:level * steplen])
+
+            if entry is None:
+                continue
+
+            distance = depth - level
+
+            if distance == 0:
+                mask = MASK_PAGE
+            elif distance == 1:
+                mask = MASK_CHILDREN | MASK_DESCENDANTS
+            else:
+                mask = MASK_DESCENDANTS
+
+            if entry[0] & mask:
                 if not is_auth_user:
                     return False
-                if perm.user_id == user_id or perm.group_id in user_groups:
+                if entry[1] & mask:
                     return True
                 restricted = True
 
@@ -111,6 +159,41 @@ def get_visible_page_contents(request, page_contents: Iterable[PageContent], sit
     return list(page_content for page_content in page_contents if user_can_see_page(page_content.page))
 
 
+def _get_ancestor_paths(page: Page) -> list[str]:
+    """Returns the paths of the ancestors of the page, and of the page itself."""
+    return [page.path[:end] for end in range(Page.steplen, len(page.path) + 1, Page.steplen)]
+
+
+def get_page_breadcrumb_filter(page: Page) -> Q:
+    """
+    Returns a filter on page contents matching the pages the breadcrumb of
+    the given page is built from: the home page and the ancestors of the page,
+    in a single lookup on their materialized paths.
+    """
+    return Q(page__is_home=True) | Q(page__path__in=_get_ancestor_paths(page))
+
+
+def get_page_window_filter(page: Optional[Page]) -> Q:
+    """
+    Returns a filter on page contents matching the pages windowed menus are
+    built from (see CMS_MENU_WINDOW): the root pages, the children of the home
+    page, the ancestors of the given page and the children of the page and of
+    its ancestors.
+    """
+    window = Q(page__depth=1) | Q(page__parent__is_home=True)
+
+    if page is None:
+        return window
+
+    steplen = Page.steplen
+    paths = _get_ancestor_paths(page)
+    window |= Q(page__path__in=paths)
+
+    for path in paths:
+        window |= Q(page__path__startswith=path, page__depth=len(path) // steplen + 1)
+    return window
+
+
 class CMSNavigationNode(NavigationNode):
     """
     Represents a CMS Navigation Node for a Page object in the page tree.
@@ -149,6 +232,13 @@ class CMSNavigationNode(NavigationNode):
         except AttributeError:
             return False
 
+    def get_selection_key(self) -> Any:
+        return self.id
+
+    @classmethod
+    def get_request_selection_key(cls, request) -> Any:
+        return getattr(getattr(request, 'current_page', None), 'pk', None)
+
 
 class CMSMenu(Menu):
     """Subclass of :class:`menus.base.Menu`. Its :meth:`~menus.base.Menu.get_nodes()` creates a list of NavigationNodes
@@ -185,6 +275,12 @@ class CMSMenu(Menu):
             # Fallback to all configured public languages for the current site.
             self.languages = get_public_languages(site_pk)
 
+        # The paths of the pages by language, prefetched by get_nodes()
+        self.page_paths = None
+        # The url of the home page and the url pattern of the other pages
+        # by language, see get_page_url()
+        self.url_patterns = {}
+
     def select_lang(self, page_contents: Iterable[PageContent]) -> Generator[PageContent, None, None]:
         """Generator that returns only those page content objects passed that contain the first language
         present in the languages list."""
@@ -205,6 +301,43 @@ class CMSMenu(Menu):
         if translation:
             yield translation
 
+    def get_page_url(self, page: Page, language: str) -> Optional[str]:
+        """
+        Returns the url of the page in the given language, as
+        page.get_absolute_url() does. With the paths of the pages prefetched
+        by get_nodes(), the url is assembled from the page path and a url
+        pattern reversed once per language, rather than reversed for each page.
+        """
+        paths = self.page_paths.get(page.pk, {}) if self.page_paths is not None else None
+
+        if paths is None or language not in page.get_languages():
+            # The path of another language might be used as a fallback
+            return page.get_absolute_url(language=language)
+
+        if language not in self.url_patterns:
+            with force_language(language):
+                try:
+                    self.url_patterns[language] = (
+                        reverse("pages-root"),
+                        reverse("pages-details-by-slug", kwargs={"slug": PAGE_PATH_MARKER}),
+                    )
+                except NoReverseMatch:
+                    self.url_patterns[language] = None
+
+        if self.url_patterns[language] is None:
+            return page.get_absolute_url(language=language)
+
+        root_url, url_pattern = self.url_patterns[language]
+
+        if page.is_home:
+            return root_url
+
+        path = paths.get(language)
+
+        if not path or not PAGE_PATH_RE.fullmatch(path):
+            return page.get_absolute_url(language=language)
+        return url_pattern.replace(PAGE_PATH_MARKER, path)
+
     def get_menu_node_for_page_content(
         self,
         page_content: PageContent,
@@ -265,7 +398,7 @@ class CMSMenu(Menu):
             # Hacky, but faster than calling `admin_reverse` for each page content object
             url = re.sub("(/0/)", f"/{page_content.pk}/", preview_url)
         else:
-            url = page.get_absolute_url(language=page_content.language)
+            url = self.get_page_url(page, page_content.language)
 
         return CMSNavigationNode(
             title=page_content.menu_title or page_content.title,
@@ -300,14 +433,15 @@ class CMSMenu(Menu):
             * Only specific fields of the page content objects are selected to optimize performance.
             * If either edit mode or preview mode is active, a preview URL is constructed for a "virtual" non-existing
               page content with id=0 to avoid too many calls to ``revert`` the admin URL.
-            * The method includes a nested function for prefetching URLs and filling the URL cache.
+            * The paths of the pages are prefetched as plain values, their urls are assembled by get_page_url().
             * The visibility of the page contents is further filtered based on authentication and permissions.
             * The homepage is determined based on the page contents and marked for cutting if necessary.
             * The menu node for each page content is created using the get_menu_node_for_page_content method of the
               instance.
-            * The prefetch_urls function is called for each page content to fill the URL cache and provide necessary
-              data for creating the menu node.
             * The select_lang method is used to filter the page contents based on the specified language preferences.
+            * In windowed mode (see ``CMS_MENU_WINDOW``), only the page contents returned by get_page_window_filter()
+              for the current page are retrieved.
+            * For breadcrumbs of public pages, only the home page and the ancestors of the current page are retrieved.
         """
         site = self.renderer.site
         toolbar = get_toolbar_from_request(request)
@@ -335,6 +469,7 @@ class CMSMenu(Menu):
                 "page__site_id",
                 "page__languages",
                 "page__parent_id",
+                "page__path",
                 "page__is_home",
                 "page__login_required",
                 "page__reverse_id",
@@ -342,30 +477,26 @@ class CMSMenu(Menu):
                 "page__application_urls",
             )
         )
+        if self.renderer.breadcrumb_only:
+            # Only build the home page and the ancestors of the current page
+            page_contents = page_contents.filter(get_page_breadcrumb_filter(self.renderer.window_page))
+        elif self.renderer.windowed:
+            # Only build the part of the tree around the current page
+            page_contents = page_contents.filter(get_page_window_filter(self.renderer.window_page))
         if toolbar.edit_mode_active or toolbar.preview_mode_active:
             # Preview URL for a "virtual" non-existing page content with id=0. This is used to quickly build many
             # preview urls by replacing "/0/" by the page content pk in the preview url
             preview_url = get_object_preview_url(PageContent(id=0))
-
-            def prefetch_urls(page_content: PageContent) -> PageContent:
-                return page_content
         else:
             preview_url = None  # No short-cut here
-            prefetched_urls = PageUrl.objects.filter(
+            page_urls = PageUrl.objects.filter(
                 language__in=self.languages,
                 page_id__in=(page_content.page.pk for page_content in page_contents),
-            )  # Fetch the PageUrl objects
-            # Prepare for filling urls_cache
-            filtered_urls = defaultdict(dict)
-            for page_url in prefetched_urls:
-                filtered_urls[page_url.page_id][page_url.language] = page_url
-
-            def prefetch_urls(page_content: PageContent) -> PageContent:
-                # Fill url cache for existing urls and page contents into the cache
-                # Access the cache directly to not lead to a db hit when accessing
-                # non-existing languages
-                page_content.page.urls_cache = filtered_urls.get(page_content.page_id)
-                return page_content
+            ).values_list("page_id", "language", "path")
+            self.page_paths = defaultdict(dict)
+
+            for page_id, language, path in page_urls:
+                self.page_paths[page_id][language] = path
 
         page_contents = get_visible_page_contents(request, page_contents, site)
         home = next((page_content for page_content in page_contents if page_content.page.is_home), None)
@@ -376,7 +507,7 @@ class CMSMenu(Menu):
 
         return [
             self.get_menu_node_for_page_content(
-                prefetch_urls(page_content),
+                page_content,
                 preview_url=preview_url,
                 cut=page_content.page.parent_id == homepage_pk and cut_homepage,
             )
@@ -394,6 +525,12 @@ class NavExtender(Modifier):
         # rearrange the parent relations
         # Find home
         home = next((n for n in nodes if n.attr.get("is_home", False)), None)
+        # Index the root nodes of each menu once, instead of looking
+        # them up for each extended node
+        ext_roots = defaultdict(list)
+        for node in nodes:
+            if not node.parent_id:
+                ext_roots[node.namespace].append(node)
         # Find nodes with NavExtenders
         exts = []
         for node in nodes:
@@ -403,8 +540,8 @@ class NavExtender(Modifier):
                     if ext not in exts:
                         exts.append(ext)
                     # Link the nodes
-                    for extnode in nodes:
-                        if extnode.namespace == ext and not extnode.parent_id:
+                    for extnode in ext_roots.get(ext, ()):
+                        if not extnode.parent_id:
                             # if home has nav extenders but home is not visible
                             if node == home and not node.visible:
                                 # extnode.parent_id = None
@@ -415,14 +552,12 @@ class NavExtender(Modifier):
                                 extnode.parent_namespace = node.namespace
                                 extnode.parent = node
                                 node.children.append(extnode)
-        removed = []
-
         # find all not assigned nodes
-        for menu in self.renderer.menus.items():
-            if hasattr(menu[1], "cms_enabled") and menu[1].cms_enabled and menu[0] not in exts:
-                for node in nodes:
-                    if node.namespace == menu[0]:
-                        removed.append(node)
+        unassigned = {
+            name for name, menu in self.renderer.menus.items()
+            if hasattr(menu, "cms_enabled") and menu.cms_enabled and name not in exts
+        }
+        removed = [node for node in nodes if node.namespace in unassigned]
         if breadcrumb:
             # if breadcrumb and home not in navigation add node
             if breadcrumb and home and not home.visible:
@@ -432,8 +567,9 @@ class NavExtender(Modifier):
                 else:
                     home.selected = False
         # remove all nodes that are nav_extenders and not assigned
-        for node in removed:
-            nodes.remove(node)
+        if removed:
+            removed = {id(node) for node in removed}
+            nodes[:] = [node for node in nodes if id(node) not in removed]
         return nodes
 
 
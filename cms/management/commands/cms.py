@@ -7,6 +7,7 @@ from .subcommands.check import CheckInstallation
 from .subcommands.copy import CopyCommand
 from .subcommands.delete_orphaned_plugins import DeleteOrphanedPluginsCommand
 from .subcommands.list import ListCommand
+from .subcommands.materialize import MaterializePlaceholdersCommand
 from .subcommands.tree import FixTreeCommand
 from .subcommands.uninstall import UninstallCommand
 
@@ -19,6 +20,7 @@ class Command(SubcommandsCommand):
         ('delete-orphaned-plugins', DeleteOrphanedPluginsCommand),
         ('fix-tree', FixTreeCommand),
         ('list', ListCommand),
+        ('materialize-placeholders', MaterializePlaceholdersCommand),
         ('uninstall', UninstallCommand),
     ))
     missing_args_message = 'one of the available sub commands must be provided'
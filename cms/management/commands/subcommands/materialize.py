@@ -0,0 +1,42 @@
+from cms.cache.materialized import materialize_placeholder
+from cms.models import PageContent
+
+from .base import SubcommandsCommand
+
+
+class MaterializePlaceholdersCommand(SubcommandsCommand):
+    help_string = ('Render the placeholders of all pages ahead of time for the materialized '
+                   'placeholders (CMS_MATERIALIZED_PLACEHOLDERS)')
+    command_name = 'materialize-placeholders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--site', action='store', dest='site', type=int,
+                            help='Only materialize the pages of the given site.')
+        parser.add_argument('--language', action='store', dest='language',
+                            help='Only materialize the given language.')
+
+    def handle(self, *args, **options):
+        verbose = options.get('verbosity') > 1
+        page_contents = PageContent.objects.select_related('page').order_by('pk')
+
+        if options.get('site'):
+            page_contents = page_contents.filter(page__site_id=options['site'])
+
+        if options.get('language'):
+            page_contents = page_contents.filter(language=options['language'])
+
+        materialized = skipped = 0
+
+        for page_content in page_contents.iterator():
+            for placeholder in page_content.get_placeholders():
+                if materialize_placeholder(placeholder, page_content.language, page_content.page.site_id):
+                    materialized += 1
+                else:
+                    skipped += 1
+                    if verbose:
+                        self.stdout.write(
+                            f'Skipped placeholder "{placeholder.slot}" (id={placeholder.pk}) '
+                            f'of {page_content} ({page_content.language})\n'
+                        )
+
+        self.stdout.write(f'Materialized {materialized} placeholders, skipped {skipped} uncacheable placeholders\n')
@@ -1,7 +1,9 @@
 from django.core.management.base import LabelCommand
 
+from cms.cache.routes import invalidate_page_routes
 from cms.models import Page
 from cms.models.pluginmodel import CMSPlugin
+from menus.menu_pool import menu_pool
 
 from .base import SubcommandsCommand
 
@@ -26,6 +28,8 @@ Type 'yes' to continue, or 'no' to cancel: """ % (number_of_apphooks, label))
                 confirm = 'yes'
             if confirm == 'yes':
                 queryset.update(application_urls=None)
+                menu_pool.clear_registry()
+                invalidate_page_routes()
                 self.stdout.write("%d '%s' apphooks uninstalled\n" % (number_of_apphooks, label))
         else:
             self.stdout.write("no '%s' apphooks found\n" % label)
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+from cms.cache.page import get_page_cache_response
+from cms.utils.conf import get_cms_setting
+
+
+class FetchFromPageCacheMiddleware(MiddlewareMixin):
+    """
+    Serves anonymous requests from the CMS page cache before any other
+    middleware runs, sparing the session, the toolbar, the url resolver
+    and the database on cache hits.
+
+    Add it as the first entry of MIDDLEWARE.
+    """
+    def is_cacheable_request(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return False
+
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            # The user might be logged in or using the toolbar,
+            # leave it to the details view to decide.
+            return False
+        return get_cms_setting('CMS_TOOLBAR_URL__ENABLE') not in request.GET
+
+    def process_request(self, request):
+        if not get_cms_setting('PAGE_CACHE') or not self.is_cacheable_request(request):
+            return None
+        return get_page_cache_response(request)
@@ -645,11 +645,11 @@ class Page(MP_Node):
         return self.pagecontent_set.filter(language=language).exists()
 
     def clear_cache(self, language=None, menu=False, placeholder=False):
-        from cms.cache import invalidate_cms_page_cache
+        from cms.cache import invalidate_cms_page_cache_dependencies
 
         if get_cms_setting('PAGE_CACHE'):
-            # Clears all the page caches
-            invalidate_cms_page_cache()
+            # Clears the page caches depending on this page
+            invalidate_cms_page_cache_dependencies([('page', self.pk)])
 
         if placeholder and get_cms_setting('PLACEHOLDER_CACHE'):
             assert language, 'language is required when clearing placeholder cache'
@@ -661,6 +661,7 @@ class Page(MP_Node):
 
         if menu:
             # Clears all menu caches for this page's site
+            # and the page caches depending on them
             menu_pool.clear(site_id=self.site_id)
 
     def get_child_pages(self):
@@ -247,6 +247,40 @@ class PermissionTuple(tuple):
         return Q()
 
 
+# The grants reaching a page from a permission on the page itself, its parent
+# and any other ancestor, see PermissionIndex.contains()
+_grants_by_distance = (
+    frozenset([ACCESS_PAGE, ACCESS_PAGE_AND_CHILDREN, ACCESS_PAGE_AND_DESCENDANTS]),
+    frozenset([ACCESS_CHILDREN, ACCESS_DESCENDANTS, ACCESS_PAGE_AND_CHILDREN, ACCESS_PAGE_AND_DESCENDANTS]),
+    frozenset([ACCESS_DESCENDANTS, ACCESS_PAGE_AND_DESCENDANTS]),
+)
+
+
+class PermissionIndex(dict):
+    """
+    Permission tuples compiled into a mapping of the paths they were granted
+    on to their grants, so that checking a path only looks up its ancestors.
+    """
+    @classmethod
+    def compile(cls, perm_tuples) -> "PermissionIndex":
+        grants = {}
+
+        for grant_on, path in perm_tuples:
+            grants.setdefault(path, set()).add(grant_on)
+        return cls((path, frozenset(grant_ons)) for path, grant_ons in grants.items())
+
+    def contains(self, path: str, steplen: int = Page.steplen) -> bool:
+        """
+        Same as any(PermissionTuple(perm).contains(path) for perm in perm_tuples)
+        """
+        for distance, end in enumerate(range(len(path), 0, -steplen)):
+            grants = self.get(path[:end])
+
+            if grants and not grants.isdisjoint(_grants_by_distance[min(distance, 2)]):
+                return True
+        return False
+
+
 class PagePermission(AbstractPagePermission):
     """Page permissions for a single page
     """
@@ -8,7 +8,8 @@ from django.template.defaultfilters import title
 from django.utils.encoding import force_str
 from django.utils.translation import gettext_lazy as _
 
-from cms.cache import invalidate_cms_page_cache
+from cms.cache import invalidate_cms_page_cache_dependencies
+from cms.cache.materialized import clear_materialized_placeholder
 from cms.cache.placeholder import clear_placeholder_cache
 from cms.constants import EXPIRE_NOW, MAX_EXPIRATION_TTL
 from cms.exceptions import LanguageError
@@ -427,13 +428,17 @@ class Placeholder(models.Model):
 
     def clear_cache(self, language, site_id=None):
         if get_cms_setting('PAGE_CACHE'):
-            # Clears all the page caches
-            invalidate_cms_page_cache()
+            # Clears the page caches depending on this placeholder
+            invalidate_cms_page_cache_dependencies([('placeholder', self.pk)])
 
         if not site_id and self.page:
             site_id = self.page.site_id
         clear_placeholder_cache(self, language, get_site_id(site_id))
 
+        if get_cms_setting('MATERIALIZED_PLACEHOLDERS'):
+            # Served normally until the placeholder is materialized again
+            clear_materialized_placeholder(self, language, get_site_id(site_id))
+
     def get_plugin_tree_order(self, language, parent_id=None):
         """
         Returns a list of plugin ids matching the given language
@@ -1,9 +1,12 @@
+from functools import partial
+
 from django.conf import settings
 from django.http import Http404, HttpResponseRedirect
 from django.template.response import TemplateResponse
 from django.urls import Resolver404, resolve, reverse
 
 from cms import __version__, constants
+from cms.cache.holes import enable_plugin_holes, fill_plugin_holes
 from cms.cache.page import set_page_cache
 from cms.models import EmptyPageContent
 from cms.utils.page_permissions import user_can_change_page, user_can_view_page
@@ -35,8 +38,11 @@ def render_page(request, page, current_language, slug=None):
 
         from cms.views import render_placeholder_content
         return render_placeholder_content(request, page_content, context)
+    enable_plugin_holes(request)
     response = TemplateResponse(request, template, context)
     response.add_post_render_callback(set_page_cache)
+    # The page is cached with the holes, which are filled afterwards
+    response.add_post_render_callback(partial(fill_plugin_holes, request))
 
     # Add headers for X Frame Options - this really should be changed upon moving to class based views
     xframe_options = page.get_xframe_options()
@@ -12,7 +12,18 @@ from django.utils.module_loading import import_string
 from django.utils.safestring import mark_safe
 from django.utils.translation import override
 
-from cms.cache.placeholder import get_placeholder_cache, set_placeholder_cache
+from cms.cache.holes import get_plugin_hole, is_plugin_hole
+from cms.cache.materialized import get_materialized_placeholders
+from cms.cache.placeholder import (
+    get_placeholder_cache,
+    get_placeholders_cache,
+    set_placeholder_cache,
+)
+from cms.cache.plugin import (
+    get_plugin_cache,
+    is_plugin_cacheable,
+    set_plugin_cache,
+)
 from cms.exceptions import PlaceholderNotFound
 from cms.models import PageContent, Placeholder
 from cms.toolbar.utils import (
@@ -86,6 +97,7 @@ class BaseRenderer:
         self._cached_templates = {}
         self._cached_plugin_classes = {}
         self._placeholders_content_cache = {}
+        self._materialized_placeholders_cache = {}
         self._placeholders_by_page_cache = {}
         self._rendered_placeholders = OrderedDict()
         self._rendered_static_placeholders = OrderedDict()
@@ -215,6 +227,20 @@ class ContentRenderer(BaseRenderer):
             return False
         return not self._placeholders_are_editable
 
+    def plugin_cache_is_enabled(self):
+        if not get_cms_setting('PLUGIN_FRAGMENT_CACHE'):
+            return False
+        if self.request.user.is_staff:
+            return False
+        return not self._placeholders_are_editable
+
+    def materialized_placeholders_are_enabled(self):
+        if not get_cms_setting('MATERIALIZED_PLACEHOLDERS'):
+            return False
+        if self.request.user.is_staff:
+            return False
+        return not self._placeholders_are_editable
+
     def render_placeholder(self, placeholder, context, language=None, page=None,
                            editable=False, use_cache=False, nodelist=None, width=None):
         from sekizai.helpers import Watcher
@@ -222,6 +248,27 @@ class ContentRenderer(BaseRenderer):
         language = language or self.request_language
         editable = editable and self._placeholders_are_editable
 
+        if use_cache and not editable and self.materialized_placeholders_are_enabled():
+            materialized_value = self._get_materialized_placeholders_content([placeholder], language)
+        else:
+            materialized_value = {}
+
+        if placeholder.pk in materialized_value:
+            # The placeholder has been rendered ahead of time,
+            # no need to load its plugins.
+            restore_sekizai_context(context, materialized_value[placeholder.pk]['sekizai'])
+            placeholder_content = materialized_value[placeholder.pk]['content']
+            self._register_rendered_placeholder(
+                placeholder,
+                language=language,
+                cached=self.placeholder_cache_is_enabled(),
+                has_content=bool(placeholder_content),
+            )
+
+            if not placeholder_content and nodelist:
+                placeholder_content = nodelist.render(context)
+            return mark_safe(placeholder_content)
+
         if use_cache and not editable and placeholder.cache_placeholder:
             use_cache = self.placeholder_cache_is_enabled()
         else:
@@ -239,6 +286,12 @@ class ContentRenderer(BaseRenderer):
             # User has opted to use the cache
             # and there is something in the cache
             restore_sekizai_context(context, cached_value['sekizai'])
+            self._register_rendered_placeholder(
+                placeholder,
+                language=language,
+                cached=True,
+                has_content=bool(cached_value['content']),
+            )
             return mark_safe(cached_value['content'])
 
         context.push()
@@ -286,25 +339,14 @@ class ContentRenderer(BaseRenderer):
                 request=self.request,
             )
 
-        rendered_placeholder = RenderedPlaceholder(
-            placeholder=placeholder,
+        self._register_rendered_placeholder(
+            placeholder,
             language=language,
-            site_id=self.current_site.pk,
             cached=use_cache,
             editable=editable,
             has_content=bool(placeholder_content),
         )
 
-        if placeholder.pk not in self._rendered_placeholders:
-            # First time this placeholder is rendered
-            if not self.toolbar._cache_disabled:
-                # The toolbar middleware needs to know if the response
-                # is to be cached.
-                # Set the _cache_disabled flag to the value of cache_placeholder
-                # only if the flag is False (meaning cache is enabled).
-                self.toolbar._cache_disabled = not use_cache
-            self._rendered_placeholders[placeholder.pk] = rendered_placeholder
-
         if editable:
             request = context.get("request", None)
             with override(request.toolbar.toolbar_language) if request else contextlib.nullcontext():
@@ -315,6 +357,30 @@ class ContentRenderer(BaseRenderer):
         context.pop()
         return mark_safe(placeholder_content)
 
+    def _register_rendered_placeholder(self, placeholder, language, cached, editable=False, has_content=False):
+        """
+        Records the «placeholder» as rendered, whether its content came from
+        the cache or not. The page cache depends on every rendered placeholder.
+        """
+        if placeholder.pk in self._rendered_placeholders:
+            return
+
+        # First time this placeholder is rendered
+        if not self.toolbar._cache_disabled:
+            # The toolbar middleware needs to know if the response
+            # is to be cached.
+            # Set the _cache_disabled flag to the value of cache_placeholder
+            # only if the flag is False (meaning cache is enabled).
+            self.toolbar._cache_disabled = not cached
+        self._rendered_placeholders[placeholder.pk] = RenderedPlaceholder(
+            placeholder=placeholder,
+            language=language,
+            site_id=self.current_site.pk,
+            cached=cached,
+            editable=editable,
+            has_content=has_content,
+        )
+
     def get_editable_placeholder_context(self, placeholder, page=None):
         placeholder_cache = self.get_rendered_plugins_cache(placeholder)
         placeholder_toolbar_js = self.get_placeholder_toolbar_js(placeholder, page)
@@ -454,6 +520,8 @@ class ContentRenderer(BaseRenderer):
         return content
 
     def render_plugin(self, instance, context, placeholder=None, editable=False):
+        from sekizai.helpers import Watcher
+
         if not placeholder:
             placeholder = instance.placeholder
 
@@ -462,6 +530,24 @@ class ContentRenderer(BaseRenderer):
         if not instance or not plugin.render_plugin:
             return ''
 
+        if not editable and is_plugin_hole(self.request, instance, plugin, placeholder):
+            # Rendered on its own once the page is served
+            return mark_safe(get_plugin_hole(self.request, instance))
+
+        use_cache = (
+            not editable
+            and self.plugin_cache_is_enabled()
+            and is_plugin_cacheable(instance, placeholder, self.request)
+        )
+
+        if use_cache:
+            cached_value = get_plugin_cache(instance, placeholder, self.current_site.pk, self.request)
+
+            if cached_value is not None:
+                restore_sekizai_context(context, cached_value['sekizai'])
+                return mark_safe(cached_value['content'])
+            watcher = Watcher(context)
+
         # we'd better pass a flat dict to template.render
         # as plugin.render can return pretty much any kind of context / dictionary
         # we'd better flatten it and force to a Context object
@@ -498,6 +584,13 @@ class ContentRenderer(BaseRenderer):
             processor = import_string(path)
             content = processor(instance, placeholder, content, context)
 
+        if use_cache and 'exc_info' not in context:
+            cached_value = {
+                'content': content,
+                'sekizai': watcher.get_changes(),
+            }
+            set_plugin_cache(instance, placeholder, self.current_site.pk, cached_value, self.request)
+
         if editable:
             content = self.plugin_edit_template.format(pk=instance.pk, content=content)
             placeholder_cache = self._rendered_plugins_by_placeholder.setdefault(placeholder.pk, {})
@@ -556,6 +649,57 @@ class ContentRenderer(BaseRenderer):
                 language_cache[placeholder.pk] = cached_value
         return language_cache.get(placeholder.pk)
 
+    def _get_cached_placeholders_content(self, placeholders, language):
+        """
+        Returns a dictionary mapping the pk of each of the given placeholders
+        found in the cache to its content and sekizai data. All placeholders
+        are looked up at once, the misses are remembered so that rendering
+        them does not query the cache again.
+        """
+        site_id = self.current_site.pk
+        site_cache = self._placeholders_content_cache.setdefault(site_id, {})
+        language_cache = site_cache.setdefault(language, {})
+        placeholders_to_fetch = [pl for pl in placeholders if pl.pk not in language_cache]
+
+        if placeholders_to_fetch:
+            cached_values = get_placeholders_cache(
+                placeholders_to_fetch,
+                lang=language,
+                site_id=site_id,
+                request=self.request,
+            )
+
+            for placeholder in placeholders_to_fetch:
+                language_cache[placeholder.pk] = cached_values.get(placeholder.pk)
+        return {
+            pl.pk: language_cache[pl.pk] for pl in placeholders
+            if language_cache[pl.pk] is not None
+        }
+
+    def _get_materialized_placeholders_content(self, placeholders, language):
+        """
+        Returns a dictionary mapping the pk of each of the given placeholders
+        that has been materialized to its content and sekizai data. Like for
+        the placeholder cache, the misses are remembered.
+        """
+        site_id = self.current_site.pk
+        site_cache = self._materialized_placeholders_cache.setdefault(site_id, {})
+        language_cache = site_cache.setdefault(language, {})
+        placeholders_to_fetch = [pl for pl in placeholders if pl.pk not in language_cache]
+
+        if placeholders_to_fetch:
+            materialized_values = get_materialized_placeholders(
+                placeholders_to_fetch,
+                lang=language,
+                site_id=site_id,
+            )
+
+            for placeholder in placeholders_to_fetch:
+                language_cache[placeholder.pk] = materialized_values.get(placeholder.pk)
+        return {
+            pl.pk: language_cache[pl.pk] for pl in placeholders
+            if language_cache[pl.pk] is not None
+        }
 
     def _get_content_object(self, page, slots=None):
         if self.toolbar.get_object() == page:
@@ -600,18 +744,23 @@ class ContentRenderer(BaseRenderer):
             # Inheritance is turned off on edit-mode
             slots_w_inheritance = []
 
-        if self.placeholder_cache_is_enabled():
-            _cached_content = self._get_cached_placeholder_content
-            # Only prefetch plugins if the placeholder
-            # has not been cached.
+        if self.materialized_placeholders_are_enabled():
+            materialized_content = self._get_materialized_placeholders_content(placeholders, self.request_language)
+            # Materialized placeholders are never rendered from their plugins.
             placeholders_to_fetch = [
                 placeholder for placeholder in placeholders
-                if _cached_content(placeholder, self.request_language) is None]
+                if placeholder.pk not in materialized_content]
         else:
-            # cache is disabled, prefetch plugins for all
-            # placeholders in the page.
             placeholders_to_fetch = placeholders
 
+        if self.placeholder_cache_is_enabled() and placeholders_to_fetch:
+            cached_content = self._get_cached_placeholders_content(placeholders_to_fetch, self.request_language)
+            # Only prefetch plugins if the placeholder
+            # has not been cached.
+            placeholders_to_fetch = [
+                placeholder for placeholder in placeholders_to_fetch
+                if placeholder.pk not in cached_content]
+
         if placeholders_to_fetch:
             assign_plugins(
                 request=self.request,
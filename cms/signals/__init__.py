@@ -4,14 +4,23 @@ from django.db.models import signals
 from django.db.models.signals import pre_migrate
 from django.dispatch import Signal, receiver
 
+from cms.cache.routes import invalidate_page_routes
 from cms.exceptions import ConfirmationOfVersion4Required
 from cms.models import (
     GlobalPagePermission,
+    Page,
+    PageContent,
     PagePermission,
+    PageUrl,
     PageUser,
     PageUserGroup,
+    Placeholder,
+)
+from cms.signals.apphook import (
+    clear_menu_registry,
+    debug_server_restart,
+    trigger_server_restart,
 )
-from cms.signals.apphook import debug_server_restart, trigger_server_restart
 from cms.signals.log_entries import (
     log_page_operations,
     log_placeholder_operations,
@@ -29,6 +38,10 @@ from cms.signals.permissions import (
     pre_save_user,
     user_m2m_changed,
 )
+from cms.signals.placeholders import (
+    materialize_changed_placeholder,
+    materialize_changed_plugin,
+)
 from cms.utils.conf import get_cms_setting
 
 
@@ -78,11 +91,41 @@ urls_need_reloading.connect(
 )
 
 
+# ################### attached menus ####################
+
+# Menus are attached to pages through their apphook or navigation extender
+signals.post_save.connect(clear_menu_registry, sender=Page, dispatch_uid='cms_post_save_page_menus')
+signals.post_delete.connect(clear_menu_registry, sender=Page, dispatch_uid='cms_post_delete_page_menus')
+page_moved.connect(clear_menu_registry, dispatch_uid='cms_page_moved_menus')
+urls_need_reloading.connect(clear_menu_registry, dispatch_uid='cms_urls_need_reloading_menus')
+
+
+# ##################### page routes #######################
+
+for model in (Page, PageUrl, PageContent):
+    signals.post_save.connect(
+        invalidate_page_routes, sender=model, dispatch_uid=f'cms_post_save_{model._meta.model_name}_routes'
+    )
+    signals.post_delete.connect(
+        invalidate_page_routes, sender=model, dispatch_uid=f'cms_post_delete_{model._meta.model_name}_routes'
+    )
+page_moved.connect(invalidate_page_routes, dispatch_uid='cms_page_moved_routes')
+
+
 # ##################### log entries #######################
 
 post_obj_operation.connect(log_page_operations)
 post_placeholder_operation.connect(log_placeholder_operations)
 
+# ################# materialized placeholders #################
+
+# Plugins are saved as instances of their own model
+signals.post_save.connect(materialize_changed_plugin, dispatch_uid='cms_post_save_plugin_materialized')
+signals.post_delete.connect(materialize_changed_plugin, dispatch_uid='cms_post_delete_plugin_materialized')
+signals.post_save.connect(
+    materialize_changed_placeholder, sender=Placeholder, dispatch_uid='cms_post_save_placeholder_materialized'
+)
+
 # ##################### permissions #######################
 
 if get_cms_setting('PERMISSION'):
@@ -19,6 +19,20 @@ def trigger_server_restart(**kwargs):
     mark_urlconf_as_changed()
 
 
+def clear_menu_registry(**kwargs):
+    """
+    Makes the menus attached to pages be looked up again, unless no menu
+    can be attached to pages.
+    """
+    from menus.menu_pool import menu_pool
+
+    # Menus not discovered yet by this process might be by others
+    if menu_pool.discovered and not any(hasattr(menu, 'get_instances') for menu in menu_pool.menus.values()):
+        return
+
+    menu_pool.clear_registry()
+
+
 def set_restart_trigger():
     request_finished.connect(trigger_restart, dispatch_uid=DISPATCH_UID)
 
@@ -28,7 +28,7 @@ def post_save_user(instance, raw, created, **kwargs):
     page_user.save()
 
     clear_user_permission_cache(instance)
-    menu_pool.clear(all=True)
+    menu_pool.clear(all=True, page_cache=False)
 
 
 def post_save_user_group(instance, raw, created, **kwargs):
@@ -52,17 +52,17 @@ def post_save_user_group(instance, raw, created, **kwargs):
 
 def pre_save_user(instance, raw, **kwargs):
     clear_user_permission_cache(instance)
-    menu_pool.clear(all=True)
+    menu_pool.clear(all=True, page_cache=False)
 
 
 def pre_delete_user(instance, **kwargs):
     clear_user_permission_cache(instance)
-    menu_pool.clear(all=True)
+    menu_pool.clear(all=True, page_cache=False)
 
 
 def pre_save_group(instance, raw, **kwargs):
     if instance.pk:
-        menu_pool.clear(all=True)
+        menu_pool.clear(all=True, page_cache=False)
         user_set = instance.user_set
         for user in user_set.all():
             clear_user_permission_cache(user)
@@ -70,7 +70,7 @@ def pre_save_group(instance, raw, **kwargs):
 
 def pre_delete_group(instance, **kwargs):
     user_set = instance.user_set
-    menu_pool.clear(all=True)
+    menu_pool.clear(all=True, page_cache=False)
     for user in user_set.all():
         clear_user_permission_cache(user)
 
@@ -80,7 +80,7 @@ def user_m2m_changed(instance, action, reverse, pk_set, **kwargs):
         "pre_add",
         "pre_remove",
     ):
-        menu_pool.clear(all=True)
+        menu_pool.clear(all=True, page_cache=False)
         if reverse:
             for user in User.objects.filter(pk__in=pk_set):
                 clear_user_permission_cache(user)
@@ -88,23 +88,24 @@ def user_m2m_changed(instance, action, reverse, pk_set, **kwargs):
             clear_user_permission_cache(instance)
 
 
-def _clear_users_permissions(instance):
+def _clear_users_permissions(instance, page_cache=False):
     if instance.user:
         clear_user_permission_cache(instance.user)
-        menu_pool.clear(all=True)
+        menu_pool.clear(all=True, page_cache=page_cache)
     if instance.group:
         user_set = instance.group.user_set
         for user in user_set.all():
             clear_user_permission_cache(user)
-        menu_pool.clear(all=True)
+        menu_pool.clear(all=True, page_cache=page_cache)
 
 
 def pre_save_pagepermission(instance, raw, **kwargs):
-    _clear_users_permissions(instance)
+    # View restrictions hide pages from anonymous visitors too
+    _clear_users_permissions(instance, page_cache=True)
 
 
 def pre_delete_pagepermission(instance, **kwargs):
-    _clear_users_permissions(instance)
+    _clear_users_permissions(instance, page_cache=True)
 
 
 def pre_save_globalpagepermission(instance, raw, **kwargs):
@@ -0,0 +1,60 @@
+from threading import local
+
+from django.db import transaction
+
+from cms.cache.materialized import materialize_placeholder
+from cms.utils.conf import get_cms_setting
+
+# (placeholder id, language) pairs to materialize once the current
+# transaction is committed, see schedule_materialization()
+_pending = local()
+
+
+def _materialize_pending():
+    from cms.models import Placeholder
+
+    pending = _pending.__dict__.pop('placeholders', set())
+    placeholders = Placeholder.objects.in_bulk({placeholder_id for placeholder_id, _ in pending})
+
+    for placeholder_id, language in sorted(pending):
+        # The placeholder might have been deleted meanwhile
+        if placeholder_id in placeholders:
+            materialize_placeholder(placeholders[placeholder_id], language)
+
+
+def schedule_materialization(placeholder_id, language):
+    """
+    Materializes the placeholder for the language once the current
+    transaction is committed, only once however many of its plugins changed.
+    """
+    _pending.__dict__.setdefault('placeholders', set()).add((placeholder_id, language))
+    # The first callback run materializes all the pending placeholders
+    transaction.on_commit(_materialize_pending)
+
+
+def materialize_changed_plugin(sender, instance, **kwargs):
+    """
+    Re-renders the placeholder of a saved or deleted plugin
+    when materialized placeholders are enabled.
+    """
+    from cms.models import CMSPlugin
+
+    if not get_cms_setting('MATERIALIZED_PLACEHOLDERS') or not isinstance(instance, CMSPlugin):
+        return
+
+    if instance.placeholder_id and not kwargs.get('raw'):
+        schedule_materialization(instance.placeholder_id, instance.language)
+
+
+def materialize_changed_placeholder(sender, instance, **kwargs):
+    """
+    Re-renders a saved placeholder in all the languages of its plugins
+    when materialized placeholders are enabled.
+    """
+    if not get_cms_setting('MATERIALIZED_PLACEHOLDERS') or kwargs.get('raw'):
+        return
+
+    languages = instance.get_plugins().values_list('language', flat=True).distinct()
+
+    for language in languages:
+        schedule_materialization(instance.pk, language)
@@ -1,4 +1,5 @@
 import sys
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Permission
@@ -7,7 +8,14 @@ from django.core import checks
 from django.core.cache import cache
 from django.core.checks.urls import check_url_config
 from django.test.utils import override_settings
-from django.urls import NoReverseMatch, clear_url_caches, resolve, reverse
+from django.urls import (
+    NoReverseMatch,
+    URLResolver,
+    clear_url_caches,
+    get_resolver,
+    resolve,
+    reverse,
+)
 from django.utils.timezone import now
 from django.utils.translation import override as force_language
 
@@ -16,16 +24,20 @@ from cms.api import create_page, create_page_content
 from cms.app_base import CMSApp
 from cms.apphook_pool import apphook_pool
 from cms.appresolver import (
+    AppRegexURLResolver,
+    _build_app_resolver,
     applications_page_check,
     clear_app_resolvers,
     get_app_patterns,
+    get_app_resolvers,
 )
 from cms.middleware.page import get_page
-from cms.models import PageContent
+from cms.models import Page, PageContent, PageUrl
 from cms.test_utils.project.placeholderapp.models import Example1
 from cms.test_utils.testcases import CMSTestCase
 from cms.tests.test_menu_utils import DumbPageLanguageUrl
 from cms.toolbar.toolbar import CMSToolbar
+from cms.utils.apphook_reload import reload_urlconf
 from menus.menu_pool import menu_pool
 from menus.utils import DefaultLanguageChanger
 
@@ -588,6 +600,106 @@ class ApphooksTestCase(CMSTestCase):
         reverse('sample2-root')
         self.apphook_clear()
 
+    @override_settings(CMS_APPHOOK_INCREMENTAL_RELOAD=True)
+    def test_apphooks_incremental_reload(self):
+        self.apphook_clear()
+        superuser = get_user_model().objects.create_superuser('admin', 'admin@admin.com', 'admin')
+        create_page("home", "nav_playground.html", "en", created_by=superuser)
+        page_1 = create_page("apphook1-page", "nav_playground.html", "en",
+                             created_by=superuser, apphook="SampleApp")
+        page_2 = create_page("apphook2-page", "nav_playground.html", "en",
+                             created_by=superuser, apphook="SampleApp2")
+        self.reload_urls()
+
+        self.assertEqual(reverse('sample-root'), '/en/apphook1-page/')
+        self.assertEqual(reverse('sample2-root'), '/en/apphook2-page/')
+        reverse('admin:index')
+
+        root_resolver = get_resolver()
+        urlpatterns = sys.modules['cms.urls'].urlpatterns
+        resolvers = {pattern.page_id: pattern for pattern in urlpatterns if isinstance(pattern, AppRegexURLResolver)}
+        admin_resolver = next(
+            pattern
+            for resolver in root_resolver.url_patterns if isinstance(resolver, URLResolver)
+            for pattern in resolver.url_patterns if getattr(pattern, 'namespace', None) == 'admin'
+        )
+
+        page_2.urls.update(slug='moved', path='moved')
+        reload_urlconf()
+
+        new_resolvers = {
+            pattern.page_id: pattern for pattern in urlpatterns if isinstance(pattern, AppRegexURLResolver)
+        }
+        self.assertIs(sys.modules['cms.urls'].urlpatterns, urlpatterns)
+        self.assertIs(get_resolver(), root_resolver)
+        # Only the resolver of the moved page is built again
+        self.assertIs(new_resolvers[page_1.pk], resolvers[page_1.pk])
+        self.assertIsNot(new_resolvers[page_2.pk], resolvers[page_2.pk])
+        self.assertEqual(len(new_resolvers), len(resolvers))
+        self.assertEqual(reverse('sample-root'), '/en/apphook1-page/')
+        self.assertEqual(reverse('sample2-root'), '/en/moved/')
+        self.assertEqual(resolve('/en/moved/').url_name, 'sample2-root')
+        # The caches of the unrelated urls are kept
+        self.assertTrue(admin_resolver._populated)
+        self.apphook_clear()
+
+    def test_applications_page_check_prefix_index(self):
+        self.apphook_clear()
+        superuser = get_user_model().objects.create_superuser('admin', 'admin@admin.com', 'admin')
+        create_page("home", "nav_playground.html", "en", created_by=superuser)
+        page_1 = create_page("apphook1-page", "nav_playground.html", "en",
+                             created_by=superuser, apphook="SampleApp")
+        create_page("apphook2-page", "nav_playground.html", "en",
+                    created_by=superuser, apphook="SampleApp2")
+        self.reload_urls()
+
+        with force_language("en"):
+            path = reverse('sample-settings')
+            request = self.get_request(path)
+            request.LANGUAGE_CODE = 'en'
+            resolvers = get_app_resolvers('apphook1-page/settings/')
+
+            self.assertEqual([resolver.page_id for resolver in resolvers], [page_1.pk])
+            self.assertEqual(get_app_resolvers('other-page/settings/'), [])
+            self.assertEqual(applications_page_check(request).pk, page_1.pk)
+
+            with self.settings(CMS_PAGE_ROUTE_TABLE=True):
+                # Loads the route table
+                applications_page_check(request)
+
+                with self.assertNumQueries(0):
+                    attached_to_page = applications_page_check(request)
+                    self.assertEqual(attached_to_page.get_path('en'), 'apphook1-page')
+        self.assertEqual(attached_to_page.pk, page_1.pk)
+        self.apphook_clear()
+
+    def test_get_app_resolvers_by_prefix(self):
+        self.apphook_clear()
+        app = apphook_pool.get_apphook(APP_NAME)
+        paths = {page_id: f'apphook-{page_id}' for page_id in range(300, 0, -1)}
+        paths[301] = 'apphook-1/nested'
+        resolvers = {
+            page_id: _build_app_resolver(page_id, [(
+                PageUrl(page=Page(pk=page_id, application_urls=APP_NAME), language='en', path=path),
+                app,
+            )])
+            for page_id, path in paths.items()
+        }
+        request = self.get_request('/en/apphook-1/nested/settings/')
+        request.LANGUAGE_CODE = 'en'
+
+        with force_language("en"), \
+                patch('cms.appresolver.APP_RESOLVERS', list(resolvers.values())), \
+                patch('cms.appresolver._get_app_page', lambda page_id: page_id):
+            # Only the resolvers of the pages the path is under, the deepest first
+            self.assertEqual(get_app_resolvers('apphook-1/nested/settings/'), [resolvers[301], resolvers[1]])
+            self.assertEqual(get_app_resolvers('apphook-1/settings/'), [resolvers[1]])
+            self.assertEqual(get_app_resolvers('apphook-10/'), [resolvers[10]])
+            self.assertEqual(get_app_resolvers('apphook-1'), [])
+            self.assertEqual(get_app_resolvers('other/settings/'), [])
+            self.assertEqual(applications_page_check(request), 301)
+        self.apphook_clear()
+
     @override_settings(ROOT_URLCONF='cms.test_utils.project.fourth_urls_for_apphook_tests')
     def test_apphooks_return_urls_directly(self):
         self.apphook_clear()
@@ -1,11 +1,23 @@
+import hashlib
+import re
 import time
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
 
 from django.conf import settings
+from django.http import HttpResponse
 from django.template import Context
+from django.urls import reverse
+from django.utils.encoding import iri_to_uri
+from django.utils.timezone import now
 from sekizai.context import SekizaiContext
 
 from cms.api import add_plugin, create_page, create_page_content
 from cms.cache import invalidate_cms_page_cache
+from cms.cache.holes import fill_plugin_holes, get_plugin_hole, get_plugin_hole_max_age
+from cms.cache.materialized import materialize_placeholder
+from cms.cache.page import _page_cache_lock_key, page_cache_stats
 from cms.cache.placeholder import (
     _get_placeholder_cache_key,
     _get_placeholder_cache_version,
@@ -13,10 +25,11 @@ from cms.cache.placeholder import (
     _set_placeholder_cache_version,
     clear_placeholder_cache,
     get_placeholder_cache,
+    get_placeholders_cache,
     set_placeholder_cache,
 )
 from cms.exceptions import PluginAlreadyRegistered
-from cms.models import Page
+from cms.models import CMSPlugin, Page, PagePermission
 from cms.plugin_pool import plugin_pool
 from cms.test_utils.project.placeholderapp.models import Example1
 from cms.test_utils.project.pluginapp.plugins.caching.cms_plugins import (
@@ -34,6 +47,7 @@ from cms.toolbar.toolbar import CMSToolbar
 from cms.toolbar.utils import get_object_edit_url
 from cms.utils.conf import get_cms_setting
 from cms.utils.helpers import get_timezone_name
+from menus.menu_pool import menu_pool
 
 
 class CacheTestCase(CMSTestCase):
@@ -91,12 +105,12 @@ class CacheTestCase(CMSTestCase):
         with self.settings(**overrides):
             with self.assertNumQueries(FuzzyInt(13, 25)):
                 self.client.get(page1_url)
-            with self.assertNumQueries(FuzzyInt(5, 13)):
+            with self.assertNumQueries(FuzzyInt(4, 13)):
                 self.client.get(page1_url)
 
         overrides["CMS_PLACEHOLDER_CACHE"] = False
         with self.settings(**overrides):
-            with self.assertNumQueries(FuzzyInt(7, 17)):
+            with self.assertNumQueries(FuzzyInt(6, 17)):
                 self.client.get(page1_url)
 
     def test_no_cache_plugin(self):
@@ -128,7 +142,7 @@ class CacheTestCase(CMSTestCase):
             request = self.get_request(page1_url)
             request.current_page = Page.objects.get(pk=page1.pk)
             request.toolbar = CMSToolbar(request)
-            with self.assertNumQueries(FuzzyInt(16, 23)):
+            with self.assertNumQueries(FuzzyInt(14, 23)):
                 response1 = self.client.get(page1_url)
                 content1 = response1.content
 
@@ -147,7 +161,7 @@ class CacheTestCase(CMSTestCase):
             request.current_page = Page.objects.get(pk=page1.pk)
             request.toolbar = CMSToolbar(request)
             with self.settings(CMS_PAGE_CACHE=False):
-                with self.assertNumQueries(FuzzyInt(5, 24)):
+                with self.assertNumQueries(FuzzyInt(4, 24)):
                     response3 = self.client.get(page1_url)
                     content3 = response3.content
             self.assertEqual(content1, content3)
@@ -172,7 +186,7 @@ class CacheTestCase(CMSTestCase):
             with self.assertNumQueries(5):
                 output2 = self.render_template_obj(template, {}, request)
             with self.settings(CMS_PAGE_CACHE=False):
-                with self.assertNumQueries(FuzzyInt(8, 16)):
+                with self.assertNumQueries(FuzzyInt(7, 16)):
                     response = self.client.get(page1_url)
                     resp2 = response.content.decode("utf8").split("$$$")[1]
             self.assertNotEqual(output, output2)
@@ -533,6 +547,507 @@ class CacheTestCase(CMSTestCase):
                 response = self.client.get(page1_url)
                 self.assertEqual(response.status_code, 200)
 
+    def test_dependency_invalidation(self):
+        # Ensure that we're testing in an environment WITHOUT the MW cache...
+        exclude = [
+            "django.middleware.cache.UpdateCacheMiddleware",
+            "django.middleware.cache.FetchFromCacheMiddleware",
+        ]
+        overrides = {
+            "MIDDLEWARE": [mw for mw in settings.MIDDLEWARE if mw not in exclude]
+        }
+        with self.settings(**overrides):
+            page1 = create_page("test page 1", "nav_playground.html", "en")
+            page2 = create_page("test page 2", "nav_playground.html", "en")
+            page1_url = page1.get_absolute_url()
+            page2_url = page2.get_absolute_url()
+            placeholder1 = page1.get_placeholders("en").get(slot="body")
+            add_plugin(placeholder1, "TextPlugin", "en", body="First content")
+
+            # Fill the cache for both pages
+            self.client.get(page1_url)
+            self.client.get(page2_url)
+            with self.assertNumQueries(0):
+                self.client.get(page1_url)
+                self.client.get(page2_url)
+
+            # Changing a placeholder only invalidates the pages rendering it
+            placeholder1.clear_cache("en")
+            with self.assertNumQueries(0):
+                response = self.client.get(page2_url)
+            self.assertEqual(response.status_code, 200)
+            with self.assertNumQueries(FuzzyInt(1, 25)):
+                response = self.client.get(page1_url)
+            self.assertContains(response, "First content")
+
+            # Changing a page only invalidates the page itself
+            Page.objects.get(pk=page2.pk).clear_cache()
+            with self.assertNumQueries(0):
+                self.client.get(page1_url)
+            with self.assertNumQueries(FuzzyInt(1, 25)):
+                self.client.get(page2_url)
+
+            # Changing the menu invalidates all pages on the site
+            Page.objects.get(pk=page2.pk).clear_cache(menu=True)
+            with self.assertNumQueries(FuzzyInt(1, 25)):
+                self.client.get(page1_url)
+            with self.assertNumQueries(FuzzyInt(1, 25)):
+                self.client.get(page2_url)
+
+            # The global version flushes all pages
+            invalidate_cms_page_cache()
+            with self.assertNumQueries(FuzzyInt(1, 25)):
+                self.client.get(page1_url)
+            with self.assertNumQueries(FuzzyInt(1, 25)):
+                self.client.get(page2_url)
+
+    def test_user_changes_keep_page_cache(self):
+        exclude = [
+            "django.middleware.cache.UpdateCacheMiddleware",
+            "django.middleware.cache.FetchFromCacheMiddleware",
+        ]
+        overrides = {
+            "MIDDLEWARE": [mw for mw in settings.MIDDLEWARE if mw not in exclude]
+        }
+        with self.settings(**overrides):
+            page1 = create_page("test page 1", "nav_playground.html", "en")
+            page1_url = page1.get_absolute_url()
+            user = self.get_superuser()
+            self.client.get(page1_url)
+
+            # Users logging in don't invalidate the pages served anonymously
+            user.last_login = now()
+            user.save()
+            stats = page_cache_stats.copy()
+            self.client.get(page1_url)
+            self.assertEqual(page_cache_stats["hit"], stats["hit"] + 1)
+            self.assertEqual(page_cache_stats["miss"], stats["miss"])
+
+            # Clearing the menus of all sites invalidates the pages of each site
+            menu_pool.clear(all=True)
+            stats = page_cache_stats.copy()
+            self.client.get(page1_url)
+            self.assertEqual(page_cache_stats["miss"], stats["miss"] + 1)
+
+    def test_stale_while_revalidate(self):
+        from django.core.cache import cache
+
+        # Ensure that we're testing in an environment WITHOUT the MW cache...
+        exclude = [
+            "django.middleware.cache.UpdateCacheMiddleware",
+            "django.middleware.cache.FetchFromCacheMiddleware",
+        ]
+        overrides = {
+            "MIDDLEWARE": [mw for mw in settings.MIDDLEWARE if mw not in exclude],
+            "CMS_PAGE_CACHE_STALE_WHILE_REVALIDATE": 30,
+        }
+        with self.settings(**overrides):
+            page1 = create_page("test page 1", "nav_playground.html", "en")
+            page1_url = page1.get_absolute_url()
+            placeholder = page1.get_placeholders("en").get(slot="body")
+            plugin = add_plugin(placeholder, "TextPlugin", "en", body="First content")
+            self.client.get(page1_url)
+            stats = page_cache_stats.copy()
+
+            plugin.body = "Second content"
+            plugin.save()
+            placeholder.clear_cache("en")
+
+            # Another worker is re-rendering the page, serve the stale content
+            lock_key = _page_cache_lock_key(self.get_request(page1_url, "en"))
+            cache.add(lock_key, True)
+            with self.assertNumQueries(0):
+                response = self.client.get(page1_url)
+            self.assertContains(response, "First content")
+            self.assertIn("max-age=0", response["Cache-Control"])
+            self.assertEqual(page_cache_stats["stale"], stats["stale"] + 1)
+
+            # Exactly one worker re-renders the page and releases the lock
+            cache.delete(lock_key)
+            with self.assertNumQueries(FuzzyInt(1, 25)):
+                response = self.client.get(page1_url)
+            self.assertContains(response, "Second content")
+            self.assertIsNone(cache.get(lock_key))
+            self.assertEqual(page_cache_stats["miss"], stats["miss"] + 1)
+
+            with self.assertNumQueries(0):
+                response = self.client.get(page1_url)
+            self.assertContains(response, "Second content")
+            self.assertEqual(page_cache_stats["hit"], stats["hit"] + 1)
+
+    def test_fetch_from_page_cache_middleware(self):
+        # Ensure that we're testing in an environment WITHOUT the MW cache...
+        exclude = [
+            "django.middleware.cache.UpdateCacheMiddleware",
+            "django.middleware.cache.FetchFromCacheMiddleware",
+        ]
+        middleware = [mw for mw in settings.MIDDLEWARE if mw not in exclude]
+        overrides = {
+            "MIDDLEWARE": ["cms.middleware.cache.FetchFromPageCacheMiddleware"] + middleware,
+        }
+        with self.settings(**overrides):
+            page1 = create_page("test page 1", "nav_playground.html", "en")
+            page1_url = page1.get_absolute_url()
+            placeholder = page1.get_placeholders("en").get(slot="body")
+            add_plugin(placeholder, "TextPlugin", "en", body="First content")
+
+            with self.assertNumQueries(FuzzyInt(1, 25)):
+                response = self.client.get(page1_url)
+            self.assertTrue(hasattr(response.wsgi_request, "toolbar"))
+
+            # Cache hits skip the rest of the middleware stack
+            with self.assertNumQueries(0):
+                response = self.client.get(page1_url)
+            self.assertContains(response, "First content")
+            self.assertFalse(hasattr(response.wsgi_request, "toolbar"))
+            self.assertFalse(hasattr(response.wsgi_request, "session"))
+
+            # Requests with a session are left to the details view
+            with self.login_user_context(self.get_superuser()):
+                response = self.client.get(page1_url)
+            self.assertTrue(hasattr(response.wsgi_request, "toolbar"))
+
+    def test_page_cache_holes(self):
+        # Ensure that we're testing in an environment WITHOUT the MW cache...
+        exclude = [
+            "django.middleware.cache.UpdateCacheMiddleware",
+            "django.middleware.cache.FetchFromCacheMiddleware",
+        ]
+        overrides = {
+            "MIDDLEWARE": [mw for mw in settings.MIDDLEWARE if mw not in exclude]
+        }
+        page1 = create_page("test page 1", "nav_playground.html", "en")
+        page1_url = page1.get_absolute_url()
+        placeholder = page1.get_placeholders("en").get(slot="body")
+        plugin_pool.register_plugin(NoCachePlugin)
+        add_plugin(placeholder, "TextPlugin", "en", body="First content")
+        no_cache_plugin = add_plugin(placeholder, "NoCachePlugin", "en")
+
+        with self.settings(CMS_PAGE_CACHE_HOLES="inline", **overrides):
+            response1 = self.client.get(page1_url)
+            self.assertContains(response1, "$$$")
+            self.assertNotContains(response1, f"cms-plugin-hole:{no_cache_plugin.pk}")
+            self.assertFalse(response1.has_header("ETag"))
+            self.assertIn("no-cache", response1["Cache-Control"])
+
+            stats = page_cache_stats.copy()
+            response2 = self.client.get(page1_url)
+            # The page is served from the cache, the plugin is rendered again
+            self.assertEqual(page_cache_stats["hit"], stats["hit"] + 1)
+            self.assertContains(response2, "First content")
+            self.assertContains(response2, "$$$")
+            self.assertNotContains(response2, f"cms-plugin-hole:{no_cache_plugin.pk}")
+            self.assertNotEqual(response1.content, response2.content)
+            self.assertIn("no-cache", response2["Cache-Control"])
+
+        invalidate_cms_page_cache()
+
+        with self.settings(CMS_PAGE_CACHE_HOLES="esi", **overrides):
+            response = self.client.get(page1_url)
+            self.assertContains(response, "<esi:include")
+            self.assertNotContains(response, "$$$")
+            self.assertEqual(response["Surrogate-Control"], 'content="ESI/1.0"')
+
+            fragment_url = reverse("cms_plugin_fragment", args=(no_cache_plugin.pk,))
+            self.assertEqual(self.client.get(fragment_url).status_code, 404)
+            fragment_url = re.search(r'<esi:include src="([^"]+)"', response.content.decode()).group(1)
+            response = self.client.get(fragment_url)
+            self.assertContains(response, "$$$")
+            self.assertNotContains(response, "First content")
+
+        plugin_pool.unregister_plugin(NoCachePlugin)
+
+    def test_page_cache_holes_signed(self):
+        page1 = create_page("test page 1", "nav_playground.html", "en")
+        secret_plugin = add_plugin(
+            page1.get_placeholders("en").get(slot="body"), "TextPlugin", "en", body="Secret content"
+        )
+        request = self.get_request(page1.get_absolute_url())
+        request.current_page = page1
+        request.toolbar = CMSToolbar(request)
+
+        with self.settings(CMS_PAGE_CACHE_HOLES="inline"):
+            # Content merely looking like holes never renders plugins
+            forged = (
+                f"<!-- cms-plugin-hole:{secret_plugin.pk} -->"
+                f"<!-- cms-plugin-hole:{secret_plugin.pk}:forged -->"
+            )
+            response = fill_plugin_holes(request, HttpResponse(forged))
+            self.assertEqual(response.content.decode(), forged)
+
+            response = fill_plugin_holes(request, HttpResponse(get_plugin_hole(request, secret_plugin)))
+            self.assertContains(response, "Secret content")
+
+    def test_plugin_fragment_checks(self):
+        page1 = create_page("test page 1", "nav_playground.html", "en")
+        placeholder = page1.get_placeholders("en").get(slot="body")
+        plugin = add_plugin(placeholder, "TextPlugin", "en", body="Secret content")
+        request = self.get_request(page1.get_absolute_url())
+        request.current_page = page1
+        request._cms_plugin_holes = "esi"
+
+        with self.settings(CMS_PAGE_CACHE_HOLES="esi"):
+            fragment_url = re.search(r'<esi:include src="([^"]+)"', get_plugin_hole(request, plugin)).group(1)
+            self.assertContains(self.client.get(fragment_url), "Secret content")
+
+            # Restricted pages are only rendered for the users who may view them
+            permission = PagePermission.objects.create(
+                page=page1, user=self.get_staff_user_with_no_permissions(), can_view=True
+            )
+            self.assertEqual(self.client.get(fragment_url).status_code, 404)
+            permission.delete()
+            self.assertContains(self.client.get(fragment_url), "Secret content")
+
+            page1.update(login_required=True)
+            self.assertEqual(self.client.get(fragment_url).status_code, 404)
+            page1.update(login_required=False)
+
+            # Tokens expire along with the cached pages holding them
+            with patch("django.core.signing.time") as mock_time:
+                mock_time.time.return_value = time.time() + get_plugin_hole_max_age() + 1
+                self.assertEqual(self.client.get(fragment_url).status_code, 404)
+
+            # Plugins moved out of the placeholder are no longer rendered
+            other_placeholder = page1.get_placeholders("en").exclude(pk=placeholder.pk).first()
+            CMSPlugin.objects.filter(pk=plugin.pk).update(placeholder=other_placeholder)
+            self.assertEqual(self.client.get(fragment_url).status_code, 404)
+
+    def test_conditional_get(self):
+        # Ensure that we're testing in an environment WITHOUT the MW cache...
+        exclude = [
+            "django.middleware.cache.UpdateCacheMiddleware",
+            "django.middleware.http.ConditionalGetMiddleware",
+            "django.middleware.cache.FetchFromCacheMiddleware",
+        ]
+        overrides = {
+            "MIDDLEWARE": [mw for mw in settings.MIDDLEWARE if mw not in exclude]
+        }
+        with self.settings(**overrides):
+            page1 = create_page("test page 1", "nav_playground.html", "en")
+            page1_url = page1.get_absolute_url()
+            placeholder = page1.get_placeholders("en").get(slot="body")
+            add_plugin(placeholder, "TextPlugin", "en", body="First content")
+
+            response = self.client.get(page1_url)
+            etag = response["ETag"]
+            last_modified = response["Last-Modified"]
+
+            with self.assertNumQueries(0):
+                response = self.client.get(page1_url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response["ETag"], etag)
+            self.assertIn("max-age", response["Cache-Control"])
+
+            with self.assertNumQueries(0):
+                response = self.client.get(page1_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+            self.assertEqual(response.status_code, 304)
+
+            response = self.client.get(page1_url, HTTP_IF_NONE_MATCH='"outdated"')
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, "First content")
+            self.assertEqual(response["ETag"], etag)
+
+    def test_precompressed_page_cache(self):
+        import gzip
+
+        # Ensure that we're testing in an environment WITHOUT the MW cache...
+        exclude = [
+            "django.middleware.cache.UpdateCacheMiddleware",
+            "django.middleware.cache.FetchFromCacheMiddleware",
+        ]
+        overrides = {
+            "MIDDLEWARE": [mw for mw in settings.MIDDLEWARE if mw not in exclude],
+            "CMS_PAGE_CACHE_COMPRESS": True,
+        }
+        with self.settings(**overrides):
+            page1 = create_page("test page 1", "nav_playground.html", "en")
+            page1_url = page1.get_absolute_url()
+            placeholder = page1.get_placeholders("en").get(slot="body")
+            add_plugin(placeholder, "TextPlugin", "en", body="First content " * 50)
+
+            response = self.client.get(page1_url)
+            self.assertIn("Accept-Encoding", response["Vary"])
+            plain_content = response.content
+
+            with self.assertNumQueries(0):
+                response = self.client.get(page1_url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+            self.assertEqual(response["Content-Encoding"], "gzip")
+            self.assertEqual(response["Content-Length"], str(len(response.content)))
+            self.assertIn("Accept-Encoding", response["Vary"])
+            self.assertTrue(response["ETag"].startswith("W/"))
+            self.assertEqual(gzip.decompress(response.content), plain_content)
+
+            # gzip is refused
+            response = self.client.get(page1_url, HTTP_ACCEPT_ENCODING="gzip;q=0")
+            self.assertFalse(response.has_header("Content-Encoding"))
+            self.assertEqual(response.content, plain_content)
+
+            response = self.client.get(page1_url)
+            self.assertFalse(response.has_header("Content-Encoding"))
+            self.assertEqual(response.content, plain_content)
+
+    def test_plugin_fragment_cache(self):
+        page1 = create_page("test page 1", "nav_playground.html", "en")
+        placeholder = page1.get_placeholders("en").get(slot="body")
+        plugin_pool.register_plugin(NoCachePlugin)
+        text_plugin = add_plugin(placeholder, "TextPlugin", "en", body="First content")
+        add_plugin(placeholder, "NoCachePlugin", "en")
+
+        def render():
+            request = self.get_request(page1.get_absolute_url())
+            request.current_page = Page.objects.get(pk=page1.pk)
+            request.toolbar = CMSToolbar(request)
+            renderer = self.get_content_renderer(request)
+            context = SekizaiContext({"request": request})
+            return renderer.render_placeholder(page1.get_placeholders("en").get(slot="body"), context, "en")
+
+        with self.settings(CMS_PLACEHOLDER_CACHE=False, CMS_PLUGIN_FRAGMENT_CACHE=True):
+            content1 = render()
+            self.assertIn("First content", content1)
+            # Changing the plugin without touching its changed_date
+            # proves the cached fragment is used
+            text_plugin.__class__.objects.filter(pk=text_plugin.pk).update(body="Second content")
+            content2 = render()
+            self.assertIn("First content", content2)
+            # The no-cache plugin is rendered each time
+            self.assertNotEqual(content1, content2)
+
+            text_plugin.refresh_from_db()
+            text_plugin.save()
+            self.assertIn("Second content", render())
+
+            # Clearing the placeholder cache flushes the fragments
+            text_plugin.__class__.objects.filter(pk=text_plugin.pk).update(body="Third content")
+            self.assertIn("Second content", render())
+            placeholder.clear_cache("en")
+            self.assertIn("Third content", render())
+
+            # So does invalidating the whole CMS cache
+            text_plugin.__class__.objects.filter(pk=text_plugin.pk).update(body="Fourth content")
+            self.assertIn("Third content", render())
+            invalidate_cms_page_cache()
+            self.assertIn("Fourth content", render())
+
+        with self.settings(CMS_PLACEHOLDER_CACHE=False, CMS_PLUGIN_FRAGMENT_CACHE=False):
+            text_plugin.__class__.objects.filter(pk=text_plugin.pk).update(body="Fifth content")
+            self.assertIn("Fifth content", render())
+        plugin_pool.unregister_plugin(NoCachePlugin)
+
+    def test_materialized_placeholders(self):
+        from django.core.management import call_command
+
+        page1 = create_page("test page 1", "nav_playground.html", "en")
+        body = page1.get_placeholders("en").get(slot="body")
+        right_column = page1.get_placeholders("en").get(slot="right-column")
+        text_plugin = add_plugin(body, "TextPlugin", "en", body="First content")
+        plugin_pool.register_plugin(NoCachePlugin)
+        add_plugin(right_column, "NoCachePlugin", "en")
+
+        def get_renderer():
+            request = self.get_request(page1.get_absolute_url())
+            request.current_page = Page.objects.get(pk=page1.pk)
+            request.toolbar = CMSToolbar(request)
+            return self.get_content_renderer(request), SekizaiContext({"request": request})
+
+        def render(placeholder, num_queries=None):
+            renderer, context = get_renderer()
+
+            if num_queries is None:
+                return renderer.render_placeholder(placeholder, context, "en", use_cache=True)
+
+            with self.assertNumQueries(num_queries):
+                return renderer.render_placeholder(placeholder, context, "en", use_cache=True)
+
+        with self.settings(CMS_PLACEHOLDER_CACHE=False, CMS_MATERIALIZED_PLACEHOLDERS=True):
+            self.assertTrue(materialize_placeholder(body, "en"))
+            # Placeholders with uncacheable plugins are not materialized
+            self.assertFalse(materialize_placeholder(right_column, "en"))
+            text_plugin.__class__.objects.filter(pk=text_plugin.pk).update(body="Second content")
+
+            self.assertIn("First content", render(body, num_queries=0))
+
+            # Editing the placeholder re-renders it
+            endpoint = self.get_change_plugin_uri(text_plugin)
+            data = {"body": "Third content"}
+
+            with self.login_user_context(self.get_superuser()), self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(endpoint, data)
+                self.assertEqual(response.status_code, 200)
+
+            self.assertIn("Third content", render(body, num_queries=0))
+
+            # So does saving a plugin outside of the editor
+            text_plugin.refresh_from_db()
+            text_plugin.body = "Fourth content"
+
+            with self.captureOnCommitCallbacks(execute=True):
+                text_plugin.save()
+            self.assertIn("Fourth content", render(body, num_queries=0))
+            renderer, context = get_renderer()
+            renderer.render_placeholder(body, context, "en", use_cache=True)
+            # The page cache depends on the materialized placeholder
+            self.assertEqual(renderer.get_rendered_placeholders(), [body])
+
+            # Clearing the cache falls back to rendering the plugins
+            text_plugin.__class__.objects.filter(pk=text_plugin.pk).update(body="Fifth content")
+            body.clear_cache("en")
+            self.assertIn("Fifth content", render(page1.get_placeholders("en").get(slot="body")))
+
+            out = StringIO()
+            call_command("cms", "materialize-placeholders", interactive=False, stdout=out)
+            self.assertIn("Materialized", out.getvalue())
+
+            self.assertIn("Fifth content", render(body, num_queries=0))
+
+        with self.settings(CMS_PLACEHOLDER_CACHE=False, CMS_MATERIALIZED_PLACEHOLDERS=False):
+            text_plugin.__class__.objects.filter(pk=text_plugin.pk).update(body="Sixth content")
+            self.assertIn("Sixth content", render(page1.get_placeholders("en").get(slot="body")))
+        plugin_pool.unregister_plugin(NoCachePlugin)
+
+    def test_dependency_on_cached_placeholder(self):
+        exclude = [
+            "django.middleware.cache.UpdateCacheMiddleware",
+            "django.middleware.cache.FetchFromCacheMiddleware",
+        ]
+        overrides = {
+            "MIDDLEWARE": [mw for mw in settings.MIDDLEWARE if mw not in exclude]
+        }
+        with self.settings(**overrides):
+            page1 = create_page("test page 1", "nav_playground.html", "en")
+            page1_url = page1.get_absolute_url()
+            placeholder1 = page1.get_placeholders("en").get(slot="body")
+            add_plugin(placeholder1, "TextPlugin", "en", body="First content")
+
+            self.client.get(page1_url)
+            Page.objects.get(pk=page1.pk).clear_cache()
+            # Rendered again, with the placeholder served from its cache
+            response = self.client.get(page1_url)
+            self.assertContains(response, "First content")
+
+            add_plugin(placeholder1, "TextPlugin", "en", body="Second content")
+            placeholder1.clear_cache("en")
+            response = self.client.get(page1_url)
+            self.assertContains(response, "Second content")
+
+    def test_earlier_page_cache_entries_ignored(self):
+        from django.core.cache import cache
+
+        page1 = create_page("test page 1", "nav_playground.html", "en")
+        page1_url = page1.get_absolute_url()
+        # An entry in the layout of earlier releases, under their key
+        earlier_key = "%s:%d:%s" % (
+            get_cms_setting("CACHE_PREFIX"),
+            settings.SITE_ID,
+            hashlib.sha1(iri_to_uri(page1_url).encode('utf-8')).hexdigest(),
+        )
+        if settings.USE_TZ:
+            earlier_key += '.%s' % get_timezone_name()
+        cache.set(earlier_key, (b"Earlier content", {}, now() + timedelta(seconds=60)))
+
+        response = self.client.get(page1_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "Earlier content")
+
     def test_sekizai_plugin(self):
         page1 = create_page("test page 1", "nav_playground.html", "en")
 
@@ -829,3 +1344,31 @@ class PlaceholderCacheTestCase(CMSTestCase):
                 self.placeholder_en, "en", 1, en_crazy_request
             )
             self.assertEqual(en_crazy_content, cached_en_crazy_content)
+
+    def test_get_placeholders_cache(self):
+        placeholder_en_2 = self.page.get_placeholders("en").get(slot="right-column")
+        set_placeholder_cache(self.placeholder_en, "en", 1, "body content", self.en_request)
+        set_placeholder_cache(placeholder_en_2, "en", 1, "right content", self.en_request)
+
+        from django.core.cache import cache
+
+        with patch.object(cache, "get_many", wraps=cache.get_many) as get_many_mock:
+            cached = get_placeholders_cache(
+                [self.placeholder_en, placeholder_en_2], "en", 1, self.en_request
+            )
+        self.assertEqual(
+            cached,
+            {self.placeholder_en.pk: "body content", placeholder_en_2.pk: "right content"},
+        )
+        self.assertEqual(get_many_mock.call_count, 2)
+        # Respects the placeholder's VARY headers
+        self.assertEqual(
+            get_placeholders_cache([self.placeholder_en], "en", 1, self.en_us_request),
+            {},
+        )
+
+        clear_placeholder_cache(placeholder_en_2, "en", 1)
+        cached = get_placeholders_cache(
+            [self.placeholder_en, placeholder_en_2], "en", 1, self.en_request
+        )
+        self.assertEqual(cached, {self.placeholder_en.pk: "body content"})
@@ -1,8 +1,13 @@
 import copy
+import random
+import time
+from collections import Counter
+from unittest.mock import patch
 
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser, Group, Permission
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.template import Template, TemplateSyntaxError
 from django.template.context import Context
 from django.test.utils import override_settings
@@ -10,8 +15,19 @@ from django.utils.translation import activate, override as force_language
 
 from cms.api import create_page, create_page_content
 from cms.apphook_pool import apphook_pool
-from cms.cms_menus import get_visible_nodes, get_visible_page_contents
-from cms.models import ACCESS_PAGE_AND_DESCENDANTS, Page, PageContent
+from cms.cms_menus import (
+    CMSMenu,
+    CMSNavigationNode,
+    get_visible_nodes,
+    get_visible_page_contents,
+)
+from cms.models import (
+    ACCESS_CHOICES,
+    ACCESS_PAGE_AND_DESCENDANTS,
+    Page,
+    PageContent,
+    PermissionTuple,
+)
 from cms.models.permissionmodels import GlobalPagePermission, PagePermission
 from cms.test_utils.fixtures.menus import (
     ExtendedMenusFixture,
@@ -36,8 +52,14 @@ from cms.utils import get_current_site
 from cms.utils.conf import get_cms_setting
 from cms.utils.i18n import get_languages
 from menus.base import NavigationNode
-from menus.menu_pool import _build_nodes_inner_for_one_menu, menu_pool
-from menus.models import CacheKey
+from menus.menu_pool import (
+    MenuRenderer,
+    _build_nodes_inner_for_one_menu,
+    _get_menu_registry_key,
+    menu_cache_stats,
+    menu_pool,
+)
+from menus.tree import NodeTree
 from menus.utils import cut_levels, find_selected, mark_descendants
 
 
@@ -144,6 +166,55 @@ class MenuDiscoveryTest(ExtendedMenusFixture, CMSTestCase):
         request_2_renderer = menu_pool.get_renderer(request_2)
         self.assertEqual(len(request_2_renderer.menus), 3)
 
+    def test_menu_compiled_for_renderers(self):
+        menu_pool.discover_menus()
+        request_1_renderer = menu_pool.get_renderer(self.get_request("/en/"))
+
+        # Menus are compiled once for all renderers
+        with self.assertNumQueries(0):
+            request_2_renderer = menu_pool.get_renderer(self.get_request("/en/"))
+        self.assertEqual(request_2_renderer.menus, request_1_renderer.menus)
+        self.assertEqual(len(request_2_renderer.menus), 1)
+
+        page = create_page("apphooked-page", "nav_playground.html", "en", navigation_extenders="StaticMenu")
+
+        request_3_renderer = menu_pool.get_renderer(self.get_request("/en/"))
+        self.assertEqual(list(request_3_renderer.menus), ["SampleAppMenu", f"StaticMenu:{page.pk}"])
+
+        # Only classes and ids are kept across requests
+        self.assertEqual(menu_pool.get_compiled_menus()[f"StaticMenu:{page.pk}"], (StaticMenu, page.pk))
+
+        # Instances are loaded by each renderer
+        with self.assertNumQueries(1):
+            menu = request_3_renderer.get_menu(f"StaticMenu:{page.pk}")
+        self.assertIsInstance(menu, StaticMenu)
+        self.assertEqual(menu.instance, page)
+        self.assertIsNot(
+            menu_pool.get_renderer(self.get_request("/en/")).get_menu(f"StaticMenu:{page.pk}").instance,
+            menu.instance,
+        )
+
+        # Other processes are told through the cache
+        menu_pool.clear_registry()
+        page.update(navigation_extenders=None)
+
+        # One query for each attached menu
+        with self.assertNumQueries(2):
+            request_4_renderer = menu_pool.get_renderer(self.get_request("/en/"))
+        self.assertEqual(list(request_4_renderer.menus), ["SampleAppMenu"])
+
+    def test_menu_registry_kept_without_attach_menus(self):
+        key = _get_menu_registry_key()
+        page = create_page("page", "nav_playground.html", "en")
+        self.assertIsNotNone(cache.get(key))
+
+        cache.delete(key)
+
+        with patch.object(menu_pool, "menus", {"SampleAppMenu": SampleAppMenu}):
+            page.save()
+            page.delete()
+        self.assertIsNone(cache.get(key))
+
     def test_menu_expanded(self):
         menu_pool.discovered = False
         menu_pool.discover_menus()
@@ -219,6 +290,62 @@ class ExtendedFixturesMenuTests(ExtendedMenusFixture, BaseMenuTest):
     def get_all_pages(self):
         return Page.objects.all()
 
+    def test_page_urls_assembled_like_absolute_urls(self):
+        for page in self.get_all_pages()[::2]:
+            create_page_content("de", f"{page.get_title('en')} de", page)
+
+        for language in ("en", "de"):
+            with force_language(language):
+                request = self.get_request(f"/{language}/", language=language)
+                menu = CMSMenu(menu_pool.get_renderer(request))
+                nodes = menu.get_nodes(request)
+                self.assertEqual(len(nodes), 11)
+
+                for node in nodes:
+                    page = Page.objects.get(pk=node.id)
+                    url_language = node.language or language
+                    self.assertEqual(node.get_absolute_url(), page.get_absolute_url(url_language), node.title)
+
+    def test_selected_node_looked_up_by_page(self):
+        page = self.get_page(10)
+        context = self.get_context(path=page.get_absolute_url(), page=page)
+        renderer = menu_pool.get_renderer(context["request"])
+
+        with patch.object(CMSNavigationNode, "is_selected") as is_selected:
+            nodes = renderer.get_nodes()
+        is_selected.assert_not_called()
+
+        selected = [node for node in nodes if node.selected]
+        self.assertEqual([node.id for node in selected], [page.pk])
+        self.assertEqual(
+            sorted(node.id for node in nodes if node.ancestor),
+            sorted(ancestor.pk for ancestor in page.get_ancestor_pages()),
+        )
+
+    def test_page_urls_assembled_without_queries(self):
+        """
+        The urls of home, nested and overridden-url pages are assembled from
+        the paths prefetched by get_nodes(), as get_absolute_url() builds them.
+        """
+        overridden = create_page(
+            "P12", "nav_playground.html", "en", parent=self.get_page(3), overwrite_url="somewhere/else"
+        )
+        request = self.get_request("/en/")
+        menu = CMSMenu(menu_pool.get_renderer(request))
+        menu.get_nodes(request)
+        pages = {page.pk: page for page in Page.objects.all()}
+        home, nested = self.get_page(1), self.get_page(11)
+        self.assertTrue(home.is_home)
+        self.assertEqual(nested.get_path("en"), "p9/p10/p11")
+        self.assertEqual(overridden.get_absolute_url("en"), "/en/somewhere/else/")
+
+        with self.assertNumQueries(0):
+            urls = {pk: menu.get_page_url(page, "en") for pk, page in pages.items()}
+
+        for pk, page in pages.items():
+            self.assertEqual(urls[pk], page.get_absolute_url("en"))
+        self.assertEqual(urls[home.pk], "/en/")
+
     def test_menu_failfast_on_invalid_usage(self):
         context = self.get_context()
         context["child"] = self.get_page(1)
@@ -255,6 +382,72 @@ class ExtendedFixturesMenuTests(ExtendedMenusFixture, BaseMenuTest):
         # default nephew limit, P2 and P9 in the nodes list
         self.assertEqual(len(nodes), 2)
 
+    def test_breadcrumb_only_builds_ancestors(self):
+        """
+        Breadcrumbs are built from the ancestors of the current page only,
+        and render like breadcrumbs built from the whole menu.
+        """
+        soft_root = self.get_page(9).get_content_obj("en")
+        soft_root.soft_root = True
+        soft_root.save()
+        hidden = self.get_page(10).get_content_obj("en")
+        hidden.in_navigation = False
+        hidden.save()
+        templates = [
+            "{% load menu_tags %}{% show_breadcrumb %}",
+            "{% load menu_tags %}{% show_breadcrumb 1 %}",
+            "{% load menu_tags %}{% show_breadcrumb 0 'menu/breadcrumb.html' 0 %}",
+        ]
+
+        def render(page):
+            menu_pool.clear(all=True)
+            context = self.get_context(path=page.get_absolute_url(), page=page)
+            return [Template(template).render(context) for template in templates]
+
+        for num in range(1, 12):
+            page = self.get_page(num)
+
+            with patch.object(MenuRenderer, "window_page", None):
+                # Without current page, the breadcrumb is built from the whole menu
+                expected = render(page)
+            self.assertEqual(render(page), expected, num)
+
+        page = self.get_page(11)
+        request = self.get_request(path=page.get_absolute_url(), page=page)
+        nodes = menu_pool.get_renderer(request).get_nodes(breadcrumb=True)
+        self.assertEqual([node.title for node in nodes], ["P9", "P10", "P11"])
+
+    def test_windowed_menu(self):
+        """
+        Windowed menus only contain the pages around the current page, and
+        render the active branch and breadcrumb like complete menus.
+        """
+        templates = [
+            "{% load menu_tags %}{% show_menu 0 100 0 1 %}",
+            "{% load menu_tags %}{% show_sub_menu 1 %}",
+            "{% load menu_tags %}{% show_breadcrumb %}",
+        ]
+
+        def render(page):
+            menu_pool.clear(all=True)
+            context = self.get_context(path=page.get_absolute_url(), page=page)
+            return [Template(template).render(context) for template in templates]
+
+        for num in range(1, 12):
+            page = self.get_page(num)
+            expected = render(page)
+
+            with self.settings(CMS_MENU_WINDOW=True):
+                self.assertEqual(render(page), expected, num)
+
+        page = self.get_page(10)
+        request = self.get_request(path=page.get_absolute_url(), page=page)
+
+        with self.settings(CMS_MENU_WINDOW=True):
+            nodes = menu_pool.get_renderer(request).get_nodes()
+        # P3 (child of P2), P5 (child of P4) and P7 and P8 (children of P6) are left out
+        self.assertEqual(sorted(node.title for node in nodes), ["P1", "P10", "P11", "P2", "P4", "P6", "P9"])
+
 
 class FixturesMenuTests(MenusFixture, BaseMenuTest):
     """
@@ -315,7 +508,8 @@ class FixturesMenuTests(MenusFixture, BaseMenuTest):
         renderer.draft_mode_active = True
         nodes_before = renderer.get_nodes()
         index_before = [i for i, s in enumerate(nodes_before) if s.title == page.get_title()]
-        self.assertEqual(CacheKey.objects.count(), 1)
+        cache_key = renderer.cache_key
+        self.assertIsNotNone(cache.get(cache_key))
 
         with self.login_user_context(self.get_superuser()):
             # Moves the page to the second position in the tree
@@ -323,7 +517,6 @@ class FixturesMenuTests(MenusFixture, BaseMenuTest):
             endpoint = self.get_admin_url(Page, "move_page", page.pk)
             response = self.client.post(endpoint, data)
             self.assertEqual(response.status_code, 200)
-            self.assertEqual(CacheKey.objects.count(), 0)
 
         request = self.get_request("/")
         renderer = menu_pool.get_renderer(request)
@@ -331,7 +524,7 @@ class FixturesMenuTests(MenusFixture, BaseMenuTest):
         nodes_after = renderer.get_nodes()
         index_after = [i for i, s in enumerate(nodes_after) if s.title == page.get_title()]
 
-        self.assertEqual(CacheKey.objects.count(), 1)
+        self.assertNotEqual(renderer.cache_key, cache_key)
         self.assertNotEqual(index_before, index_after, "Index should not be the same after move page in navigation")
 
     def test_cms_menu_public_with_multiple_languages(self):
@@ -417,14 +610,12 @@ class FixturesMenuTests(MenusFixture, BaseMenuTest):
     def test_show_menu_num_queries(self):
         context = self.get_context()
         # test standard show_menu
-        with self.assertNumQueries(5):
+        with self.assertNumQueries(3):
             """
             The queries should be:
                 get all page contents
                 get all page permissions
                 get all page urls
-                get the menu cache key
-                set the menu cache key
             """
             tpl = Template("{% load menu_tags %}{% show_menu %}")
             tpl.render(context)
@@ -432,59 +623,102 @@ class FixturesMenuTests(MenusFixture, BaseMenuTest):
     def test_show_menu_cache_key_leak(self):
         context = self.get_context()
         tpl = Template("{% load menu_tags %}{% show_menu %}")
-        self.assertEqual(CacheKey.objects.count(), 0)
         tpl.render(context)
-        self.assertEqual(CacheKey.objects.count(), 1)
+        cache_key = menu_pool.get_renderer(context["request"]).cache_key
+        self.assertIsNotNone(cache.get(cache_key))
         tpl.render(context)
-        self.assertEqual(CacheKey.objects.count(), 1)
+        self.assertEqual(menu_pool.get_renderer(context["request"]).cache_key, cache_key)
 
-    def test_menu_cache_respects_database_keys(self):
+    def test_menu_cache_is_versioned(self):
         cms_page = self.get_page(1)
         context = self.get_context(path=cms_page.get_absolute_url(), page=cms_page)
         context["request"].session["cms_edit"] = False
 
         # Prime the cache
-        with self.assertNumQueries(5):
+        with self.assertNumQueries(3):
             # The queries should be:
             #     get all page contents
             #     get all page permissions
             #     get all page urls
-            #     get the menu cache key
-            #     set the menu cache key
             Template("{% load menu_tags %}{% show_menu %}").render(context)
 
-        # One new CacheKey should have been created
-        self.assertEqual(CacheKey.objects.count(), 1)
+        # Because its cached, no query is made to the db
+        with self.assertNumQueries(0):
+            Template("{% load menu_tags %}{% show_menu %}").render(context)
 
-        # Because its cached, only one query is made to the db
-        with self.assertNumQueries(1):
-            # The queries should be:
-            #     get the menu cache key
+        # Invalidating another language or site leaves the menu cached
+        menu_pool.clear(site_id=1, language="fr")
+        menu_pool.clear(site_id=2)
+
+        with self.assertNumQueries(0):
             Template("{% load menu_tags %}{% show_menu %}").render(context)
 
-        # Delete the current cache key but don't touch the cache
-        CacheKey.objects.all().delete()
+        # Invalidate the menus of the site, without touching the cached entry
+        menu_pool.clear(site_id=1)
 
         # The menu should be recalculated
-        with self.assertNumQueries(5):
-            # The queries should be:
-            #     check if cache key exists
-            #     get all page contents
-            #     get all page permissions
-            #     get all page url objects
-            #     set the menu cache key
+        with self.assertNumQueries(3):
             Template("{% load menu_tags %}{% show_menu %}").render(context)
 
-    def test_menu_keys_duplicate_clear(self):
-        """
-        Tests that the menu clears all keys, including duplicates.
-        """
-        CacheKey.objects.create(language="fr", site=1, key="a")
-        CacheKey.objects.create(language="fr", site=1, key="a")
+        menu_pool.clear(language="en")
 
-        self.assertEqual(CacheKey.objects.count(), 2)
-        menu_pool.clear(site_id=1, language="fr")
-        self.assertEqual(CacheKey.objects.count(), 0)
+        with self.assertNumQueries(3):
+            Template("{% load menu_tags %}{% show_menu %}").render(context)
+
+        menu_pool.clear(all=True)
+
+        with self.assertNumQueries(3):
+            Template("{% load menu_tags %}{% show_menu %}").render(context)
+
+    @override_settings(CMS_MENU_STALE_WHILE_REBUILD=60, CMS_MENU_REBUILD_LOCK_WAIT=0)
+    def test_menu_rebuild_is_single_flight(self):
+        cms_page = self.get_page(1)
+        context = self.get_context(path=cms_page.get_absolute_url(), page=cms_page)
+        template = Template("{% load menu_tags %}{% show_menu %}")
+        renderer = menu_pool.get_renderer(context["request"])
+        latest_key = renderer._cache_key_base + ":latest"
+        lock_key = latest_key + ".lock"
+
+        with self.assertNumQueries(3):
+            expected = template.render(context)
+        self.assertIsNone(cache.get(lock_key))
+
+        menu_pool.clear(site_id=1)
+        # Another worker is rebuilding the menus
+        cache.add(lock_key, True, 60)
+        stats = menu_cache_stats.copy()
+
+        # The outdated menus are served meanwhile
+        with self.assertNumQueries(0):
+            self.assertEqual(template.render(context), expected)
+        self.assertEqual(menu_cache_stats["stale"], stats["stale"] + 1)
+
+        # Without menus to serve, the worker waits for the rebuild,
+        # then gives up and rebuilds the menus itself.
+        cache.delete(latest_key)
+
+        with self.assertNumQueries(3):
+            self.assertEqual(template.render(context), expected)
+        self.assertEqual(menu_cache_stats["wait"], stats["wait"] + 1)
+        self.assertEqual(menu_cache_stats["rebuild"], stats["rebuild"] + 1)
+
+        cache.delete(lock_key)
+        menu_pool.clear(site_id=1)
+
+        with self.assertNumQueries(3):
+            self.assertEqual(template.render(context), expected)
+        self.assertEqual(menu_cache_stats["rebuild"], stats["rebuild"] + 2)
+        self.assertIsNone(cache.get(lock_key))
+
+        # Outdated menus are only served within the configured window
+        cache.add(lock_key, True, 60)
+        menu_pool.clear(site_id=1)
+
+        with patch("menus.menu_pool.time.time", return_value=time.time() + 120):
+            with self.assertNumQueries(3):
+                self.assertEqual(template.render(context), expected)
+        self.assertEqual(menu_cache_stats["stale"], stats["stale"] + 1)
+        cache.delete(lock_key)
 
     def test_only_active_tree(self):
         context = self.get_context(page=self.get_page(1))
@@ -672,6 +906,40 @@ class FixturesMenuTests(MenusFixture, BaseMenuTest):
         # P3 is a child of P2, but not in nodes list
         self.assertTrue(nodes[0].children)
 
+    def test_menu_fragment_cache(self):
+        template = Template(
+            "{% load menu_tags %}{% show_menu 0 100 100 100 %}|{% show_sub_menu %}|{% show_breadcrumb %}"
+        )
+
+        for num in (1, 3, 5, 8):
+            page = self.get_page(num)
+            path = page.get_absolute_url()
+            expected = template.render(self.get_context(path=path, page=page))
+
+            with self.settings(CMS_MENU_FRAGMENT_CACHE=True):
+                menu_pool.clear(all=True)
+                self.assertEqual(template.render(self.get_context(path=path, page=page)), expected)
+
+                # The fragments are rendered once per page
+                with patch.object(MenuRenderer, "apply_modifiers", side_effect=AssertionError):
+                    self.assertEqual(template.render(self.get_context(path=path, page=page)), expected)
+
+        page = self.get_page(5)
+        context = self.get_context(path=page.get_absolute_url(), page=page)
+
+        with self.settings(CMS_MENU_FRAGMENT_CACHE=True):
+            template.render(context)
+            title = page.get_content_obj("en")
+            title.menu_title = "P5 renamed"
+            title.save()
+            menu_pool.clear(site_id=1)
+            # The fragments are cached along with the menus
+            self.assertIn("P5 renamed", template.render(context))
+
+            # Only for anonymous visitors
+            context["request"].user = self.get_superuser()
+            self.assertIsNone(menu_pool.get_renderer(context["request"]).get_fragment_cache_key("show_menu"))
+
     def test_show_breadcrumb(self):
         page_3 = self.get_page(3)
         context = self.get_context(path=self.get_page(3).get_absolute_url(), page=page_3)
@@ -919,12 +1187,143 @@ class MenuTests(BaseMenuTest):
 
     def test_build_nodes_inner_for_circular_menu(self):
         """
-        TODO:
-            To properly handle this test we need to have a circular dependency
-            detection system.
-            Go nuts implementing it :)
+        Tests a circular menu tree
+
+        node1
+         node2
+
+        node3 <-> node4
+         node5
         """
-        pass
+        node1 = NavigationNode("Test1", "/test1/", 1, None)
+        node2 = NavigationNode("Test2", "/test2/", 2, 1)
+        node3 = NavigationNode("Test3", "/test3/", 3, 4)
+        node4 = NavigationNode("Test4", "/test4/", 4, 3)
+        node5 = NavigationNode("Test5", "/test5/", 5, 3)
+
+        final_list = _build_nodes_inner_for_one_menu([node5, node4, node3, node2, node1], "Test")
+        self.assertEqual(final_list, [node1, node2])
+        self.assertEqual(node3.parent, None)
+        self.assertEqual(node4.parent, None)
+        self.assertEqual(node5.parent, None)
+
+    def test_build_nodes_inner_ordering(self):
+        """
+        Nodes listed before their parent are moved after it,
+        in the order of as many passes as needed over the list.
+        """
+        node1 = NavigationNode("Test1", "/test1/", 1, None)
+        node2 = NavigationNode("Test2", "/test2/", 2, 4)
+        node3 = NavigationNode("Test3", "/test3/", 3, 1)
+        node4 = NavigationNode("Test4", "/test4/", 4, 1)
+        node5 = NavigationNode("Test5", "/test5/", 5, 2)
+        node6 = NavigationNode("Test6", "/test6/", 6, 1)
+        node7 = NavigationNode("Test7", "/test7/", 7, None, parent_namespace="Other")
+        node7.namespace = "Other"
+
+        nodes = [node5, node2, node1, node3, node4, node7, node6]
+        final_list = _build_nodes_inner_for_one_menu(nodes, "Test")
+        self.assertEqual(final_list, [node1, node3, node4, node7, node6, node2, node5])
+        self.assertEqual(node1.children, [node3, node4, node6])
+        self.assertEqual(node4.children, [node2])
+        self.assertEqual(node2.children, [node5])
+        self.assertEqual(node3.parent_namespace, "Test")
+        self.assertEqual(node7.namespace, "Other")
+
+    def test_build_nodes_inner_scales_linearly(self):
+        """
+        Building a chain of nodes listed children first, the worst case for
+        the former builder, reads the parent of each node a bounded number of
+        times rather than once per pass over the list.
+        """
+        reads = Counter()
+
+        class CountingNode(NavigationNode):
+            @property
+            def parent_id(self):
+                reads[id(self)] += 1
+                return self._parent_id
+
+            @parent_id.setter
+            def parent_id(self, value):
+                self._parent_id = value
+
+        count = 1000
+        nodes = [CountingNode(str(pk), "/", pk, pk - 1 or None) for pk in range(1, count + 1)]
+        final_list = _build_nodes_inner_for_one_menu(nodes[::-1], "Test")
+
+        self.assertEqual(final_list, nodes)
+        self.assertEqual(len(reads), count)
+        self.assertLessEqual(max(reads.values()), 4)
+
+    def test_node_tree_marks_like_node_links(self):
+        """
+        Marking the selected node through the NodeTree gives the same result
+        as walking the links between the nodes.
+        """
+        rnd = random.Random(3)
+        nodes = [NavigationNode("1", "/1/", 1, None)]
+
+        for pk in range(2, 200):
+            nodes.append(NavigationNode(str(pk), f"/{pk}/", pk, rnd.choice([None, rnd.randint(1, pk - 1)])))
+
+        nodes = _build_nodes_inner_for_one_menu(nodes, "Test")
+        tree = NodeTree(nodes)
+        self.assertEqual(sorted(tree.preorder), list(range(len(nodes))))
+
+        for position, node in enumerate(nodes):
+            self.assertEqual(tree.levels[position], len(tree.get_ancestors(position)))
+            self.assertEqual([nodes[child] for child in tree.get_children(position)], node.children)
+
+        renderer = menu_pool.get_renderer(self.get_request("/"))
+
+        def get_marks(nodes, url, node_tree):
+            renderer.request.path = url
+            renderer._node_tree = node_tree
+            renderer._mark_selected(nodes)
+            return [
+                (node.id, node.selected, node.ancestor, node.descendant, node.sibling)
+                for node in nodes
+            ]
+
+        for url in ("/1/", "/17/", "/150/", "/199/", "/nowhere/"):
+            expected = get_marks(copy.deepcopy(nodes), url, None)
+            marks = copy.deepcopy(nodes)
+            self.assertEqual(get_marks(marks, url, (marks, NodeTree(marks))), expected)
+
+    def test_node_tree_selection_index(self):
+        """
+        The selected node is looked up through the index built along with the
+        tree, is_selected() being only called on nodes overriding it alone.
+        """
+        checked = []
+
+        class PrefixNode(NavigationNode):
+            def is_selected(self, request):
+                checked.append(self.id)
+                return request.path.startswith(self.url)
+
+        nodes = _build_nodes_inner_for_one_menu([
+            NavigationNode("1", "/1/", 1),
+            PrefixNode("2", "/2/", 2),
+            NavigationNode("3", "/2/3/", 3),
+            CMSNavigationNode("4", "/4/", 4),
+        ], "Test")
+        tree = NodeTree(nodes)
+
+        def get_selected(path, current_page=None):
+            request = self.get_request(path)
+            request.current_page = current_page
+            checked.clear()
+            return tree.get_selected(nodes, request)
+
+        self.assertEqual(get_selected("/1/"), 0)
+        self.assertEqual(checked, [])
+        # Nodes without selection key are checked in order
+        self.assertEqual(get_selected("/2/3/"), 1)
+        self.assertEqual(checked, [2])
+        self.assertEqual(get_selected("/4/", AttributeObject(pk=4)), 3)
+        self.assertEqual(get_selected("/nowhere/"), None)
 
     def test_build_nodes_inner_for_broken_menu(self):
         """
@@ -1394,14 +1793,12 @@ class ShowSubMenuCheck(SubMenusFixture, BaseMenuTest):
         context = self.get_context(page.get_absolute_url(), page=page)
 
         # test standard show_menu
-        with self.assertNumQueries(5):
+        with self.assertNumQueries(3):
             """
             The queries should be:
                 get all page contents
                 get all page permissions
                 get all page urls
-                get the menu cache key
-                set the menu cache key
             """
             tpl = Template("{% load menu_tags %}{% show_sub_menu %}")
             tpl.render(context)
@@ -1557,14 +1954,12 @@ class ShowMenuBelowIdTests(BaseMenuTest):
 
         with LanguageOverride("en"):
             context = self.get_context(a.get_absolute_url())
-            with self.assertNumQueries(5):
+            with self.assertNumQueries(3):
                 """
                 The queries should be:
                     get all page urls
                     get all page contents
                     get all page permissions
-                    get the menu cache key
-                    set the menu cache key
                 """
                 # Actually seems to run:
                 tpl = Template("{% load menu_tags %}{% show_menu_below_id 'a' 0 100 100 100 %}")
@@ -1757,6 +2152,60 @@ class ViewPermissionMenuTests(CMSTestCase):
             visible = get_visible_page_contents(request, all, self.site)
             self.assertEqual(visible, all)
 
+    def test_restrictions_match_permission_tuples(self):
+        """
+        The compiled view restrictions give the same result as checking
+        each restriction against each page.
+        """
+        rnd = random.Random(42)
+        pages = [self.page]
+
+        for i in range(24):
+            pages.append(create_page(f"page {i}", "nav_playground.html", "en", parent=rnd.choice(pages)))
+
+        group = Group.objects.create(name="testgroup")
+        self.user.groups.add(group)
+        other = self._create_user("other", is_staff=False, is_superuser=False)
+        audiences = [{"user": self.user}, {"group": group}, {"user": other}]
+        grant_modes = [choice[0] for choice in ACCESS_CHOICES]
+
+        for grant_on in grant_modes:
+            for audience in audiences:
+                PagePermission.objects.create(can_view=True, page=rnd.choice(pages), grant_on=grant_on, **audience)
+
+        restrictions = [
+            (perm, PermissionTuple((perm.grant_on, perm.page.path)))
+            for perm in PagePermission.objects.filter(can_view=True).select_related("page")
+        ]
+
+        def user_can_see_page(user, page, can_see_unrestricted):
+            restricted = False
+
+            for perm, perm_tuple in restrictions:
+                if perm_tuple.contains(page.path):
+                    if not user.is_authenticated:
+                        return False
+                    if perm.user_id == user.pk or (perm.group_id == group.pk and user.pk == self.user.pk):
+                        return True
+                    restricted = True
+            return can_see_unrestricted and not restricted
+
+        all = [page.get_content_obj() for page in Page.objects.order_by("path")]
+
+        for public_for in ("all", "staff"):
+            for user in (self.user, other, AnonymousUser()):
+                can_see_unrestricted = public_for == "all" or (public_for == "staff" and user.is_staff)
+
+                with self.settings(CMS_PUBLIC_FOR=public_for):
+                    visible = get_visible_page_contents(self.get_request(user), all, self.site)
+
+                expected = [
+                    page_content for page_content in all
+                    if (user.is_authenticated or can_see_unrestricted)
+                    and user_can_see_page(user, page_content.page, can_see_unrestricted)
+                ]
+                self.assertEqual(visible, expected)
+
 
 @override_settings(
     CMS_PERMISSION=True,
@@ -1807,6 +2256,50 @@ class PublicViewPermissionMenuTests(CMSTestCase):
         titles = [page_content.title for page_content in page_contents]
         self.assertSequenceEqual(sorted(titles), ["a", "b1", "c1", "c2"])
 
+    @override_settings(CMS_MENU_SHARED_BY_VISIBILITY=True)
+    def test_menu_cache_shared_by_equivalent_users(self):
+        group = Group.objects.create(name="b2 readers")
+        PagePermission.objects.create(
+            page=self.pages[4], group=group, can_view=True, grant_on=ACCESS_PAGE_AND_DESCENDANTS
+        )
+        readers = [self._create_user(f"reader{i}", is_staff=False, is_superuser=False) for i in range(2)]
+
+        for reader in readers:
+            reader.groups.add(group)
+
+        def get_menu_titles(user):
+            request = self.get_request("/")
+            request.user = user
+            renderer = menu_pool.get_renderer(request)
+            nodes = renderer.get_nodes()
+            return renderer.cache_key, sorted(node.title for node in nodes)
+
+        key1, titles1 = get_menu_titles(readers[0])
+        self.assertSequenceEqual(titles1, ["a", "b2", "c3", "c4"])
+
+        # The second reader gets the same menu from the cache
+        key2, titles2 = get_menu_titles(readers[1])
+        self.assertEqual(key1, key2)
+        self.assertEqual(titles1, titles2)
+
+        # Users with other restrictions get their own menu
+        user_key, user_titles = get_menu_titles(self.user)
+        other_key, other_titles = get_menu_titles(self.other)
+        self.assertEqual(len({key1, user_key, other_key}), 3)
+        self.assertSequenceEqual(user_titles, ["a", "b1", "c1", "c2"])
+        self.assertSequenceEqual(other_titles, ["a", "b2", "c3", "c4"])
+
+    def test_menu_cache_per_user_by_default(self):
+        readers = [self._create_user(f"reader{i}", is_staff=False, is_superuser=False) for i in range(2)]
+        keys = set()
+
+        for reader in readers:
+            request = self.get_request("/")
+            request.user = reader
+            keys.add(menu_pool.get_renderer(request).cache_key)
+
+        self.assertEqual(len(keys), 2)
+
 
 @override_settings(CMS_PERMISSION=False)
 class SoftrootTests(CMSTestCase):
@@ -7,10 +7,17 @@ from cms.cache.permissions import (
     get_permission_cache,
     set_permission_cache,
 )
-from cms.models.permissionmodels import ACCESS_PAGE_AND_DESCENDANTS, GlobalPagePermission
+from cms.models.permissionmodels import (
+    ACCESS_CHOICES,
+    ACCESS_PAGE_AND_DESCENDANTS,
+    GlobalPagePermission,
+    PermissionIndex,
+    PermissionTuple,
+)
 from cms.test_utils.testcases import CMSTestCase
 from cms.utils.page_permissions import (
     get_change_perm_tuples,
+    has_generic_permission,
     user_can_publish_page,
 )
 
@@ -65,6 +72,40 @@ class PermissionCacheTests(CMSTestCase):
         self.assertEqual(live_permissions, [(ACCESS_PAGE_AND_DESCENDANTS, page_b.node.path)])
         self.assertEqual(cached_permissions_permissions, live_permissions)
 
+    def test_permission_index_cached(self):
+        page_b = create_page("page_b", "nav_playground.html", "en",
+                             created_by=self.user_super)
+        page_c = create_page("page_c", "nav_playground.html", "en",
+                             created_by=self.user_super, parent=page_b)
+        assign_user_to_page(page_b, self.user_normal, can_view=True,
+                            can_change=True)
+        site = Site.objects.get_current()
+
+        self.assertTrue(has_generic_permission(page_c, self.user_normal, "change_page", site=site))
+        self.assertFalse(has_generic_permission(self.home_page, self.user_normal, "change_page", site=site))
+        self.assertEqual(
+            get_permission_cache(self.user_normal, "change_page_index"),
+            {page_b.node.path: {ACCESS_PAGE_AND_DESCENDANTS}},
+        )
+
+        clear_user_permission_cache(self.user_normal)
+        self.assertIsNone(get_permission_cache(self.user_normal, "change_page_index"))
+
+    def test_permission_index_contains(self):
+        paths = ["0001", "00010001", "000100010001", "0001000100010001", "00010002", "0002"]
+
+        for grant_on, _ in ACCESS_CHOICES:
+            for perm_path in paths:
+                perm_tuple = PermissionTuple((grant_on, perm_path))
+                perm_index = PermissionIndex.compile([perm_tuple])
+
+                for path in paths:
+                    self.assertEqual(
+                        perm_index.contains(path, steplen=4),
+                        perm_tuple.contains(path, steplen=4),
+                        (grant_on, perm_path, path),
+                    )
+
     def test_cached_permission_precedence(self):
         # refs - https://github.com/divio/django-cms/issues/6335
         # cached page permissions should not override global permissions
@@ -1,4 +1,8 @@
+from threading import Thread
+from unittest.mock import patch
+
 from django.conf import settings
+from django.core.cache import cache
 from django.test.utils import override_settings
 
 from cms.api import create_page
@@ -7,6 +11,7 @@ from cms.signals import urls_need_reloading
 from cms.test_utils.project.sampleapp.cms_apps import SampleApp
 from cms.test_utils.testcases import CMSTestCase
 from cms.test_utils.util.context_managers import apphooks, signal_tester
+from cms.utils import apphook_reload
 
 overrides = {
     'MIDDLEWARE': ['cms.middleware.utils.ApphookReloadMiddleware'] + settings.MIDDLEWARE,
@@ -93,3 +98,66 @@ class SignalTests(CMSTestCase):
                     self.assertEqual(env.call_count, 1)
                     new_revision, _ = UrlconfRevision.get_or_create_revision()
                     self.assertNotEqual(current_revision, new_revision)
+
+
+class ApphookRevisionTests(CMSTestCase):
+
+    def setUp(self):
+        super().setUp()
+        UrlconfRevision.get_or_create_revision()
+
+    def tearDown(self):
+        apphook_reload.set_last_revision_check(None)
+        super().tearDown()
+
+    @override_settings(CMS_APPHOOK_REVISION_CACHE=True)
+    def test_revision_mirrored_in_cache(self):
+        with self.assertNumQueries(1):
+            revision = apphook_reload.get_global_revision()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(apphook_reload.get_global_revision(), revision)
+
+        new_revision = apphook_reload.mark_urlconf_as_changed()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(apphook_reload.get_global_revision(), new_revision)
+
+        # The database remains the source of truth
+        cache.clear()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(apphook_reload.get_global_revision(), new_revision)
+
+    @override_settings(CMS_APPHOOK_REVISION_CHECK_INTERVAL=60000)
+    def test_revision_checked_at_interval(self):
+        apphook_reload.ensure_urlconf_is_up_to_date()
+
+        # Changes made by other processes are seen after the interval
+        UrlconfRevision.update_revision("other-process")
+
+        with self.assertNumQueries(0):
+            apphook_reload.ensure_urlconf_is_up_to_date()
+        self.assertNotEqual(apphook_reload.get_local_revision(), "other-process")
+
+        # Changes made by the process are checked right away
+        new_revision = apphook_reload.mark_urlconf_as_changed()
+        apphook_reload.ensure_urlconf_is_up_to_date()
+        self.assertEqual(apphook_reload.get_local_revision(), new_revision)
+
+    @override_settings(CMS_APPHOOK_REVISION_CHECK_INTERVAL=60000)
+    def test_revision_checked_at_interval_per_thread(self):
+        with patch.object(apphook_reload, "use_threadlocal", True):
+            apphook_reload.ensure_urlconf_is_up_to_date()
+            self.assertIsNotNone(apphook_reload.get_last_revision_check())
+            self.assertIsNone(apphook_reload._last_revision_check.get("time"))
+
+            # Other threads check the revision along with their own
+            checks = []
+            thread = Thread(target=lambda: checks.append(apphook_reload.get_last_revision_check()))
+            thread.start()
+            thread.join()
+            self.assertEqual(checks, [None])
+
+            apphook_reload.set_last_revision_check(None)
+            apphook_reload.set_local_revision(None)
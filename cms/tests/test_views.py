@@ -1,11 +1,14 @@
 import re
 import sys
+import time
+from unittest.mock import patch
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.models import ContentType
 from django.core.cache import cache
+from django.db import transaction
 from django.http import Http404, HttpResponse
 from django.template import Variable
 from django.test.utils import override_settings
@@ -14,6 +17,11 @@ from django.utils.translation import override as force_language
 
 from cms import api
 from cms.api import create_page, create_page_content
+from cms.cache.routes import (
+    _get_route_generation_key,
+    get_route_generation,
+    get_route_table,
+)
 from cms.middleware.toolbar import ToolbarMiddleware
 from cms.models import PageContent, PagePermission, Placeholder, UserSettings
 from cms.page_rendering import _handle_no_page
@@ -205,6 +213,70 @@ class ViewTests(CMSTestCase):
             self.assertEqual(response.status_code, 302)
             self.assertTrue(login_rx.search(response['Location']))
 
+    @override_settings(CMS_PAGE_CACHE=False)
+    def test_page_route_table(self):
+        home = self.create_homepage("home", "nav_playground.html", "en")
+        create_page_content("de", "home de", home)
+        one = create_page("one", "nav_playground.html", "en", parent=home)
+        create_page_content("de", "eins", one)
+        create_page("two", "nav_playground.html", "en", parent=one, redirect="/en/")
+        create_page("three", "nav_playground.html", "en", login_required=True)
+        paths = ["/en/", "/de/", "/en/one/", "/de/eins/", "/de/one/", "/en/one/two/", "/en/three/", "/en/four/"]
+
+        def get_responses():
+            return [
+                (response.status_code, response.get("Location"), response.content)
+                for response in (self.client.get(path) for path in paths)
+            ]
+
+        expected = get_responses()
+        # Route tables aren't invalidated while disabled
+        self.assertIsNone(cache.get(_get_route_generation_key()))
+
+        with self.settings(CMS_PAGE_ROUTE_TABLE=True):
+            self.assertEqual(get_responses(), expected)
+
+            # Pages are resolved without queries once the table is loaded
+            request = self.get_request("/en/one/")
+
+            with self.assertNumQueries(0):
+                page = get_page_from_request(request, use_path="one")
+                self.assertEqual(page, one)
+                self.assertEqual(page.get_title("de"), "eins")
+                self.assertEqual(page.get_absolute_url("en"), "/en/one/")
+
+            # The table is loaded again once a page changes
+            content = one.get_content_obj("en")
+            content.title = "one changed"
+            content.save()
+            self.assertContains(self.client.get("/en/one/"), "one changed")
+
+            one.delete()
+            self.assertEqual(self.client.get("/en/one/").status_code, 404)
+
+    @override_settings(CMS_PAGE_ROUTE_TABLE=True)
+    def test_page_route_table_invalidated_on_commit(self):
+        one = create_page("one", "nav_playground.html", "en")
+        site = one.site
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                content = one.get_content_obj("en")
+                content.title = "one changed"
+                content.save()
+                # Another process might load its table before the commit
+                generation = get_route_generation()
+        self.assertNotEqual(get_route_generation(), generation)
+
+        # Tables are loaded again once older than the menus cache duration
+        table = get_route_table(site)
+        self.assertIs(get_route_table(site), table)
+
+        duration = get_cms_setting("CACHE_DURATIONS")["menus"]
+
+        with patch("cms.cache.routes.time.monotonic", return_value=time.monotonic() + duration + 1):
+            self.assertIsNot(get_route_table(site), table)
+
     def test_edit_permission(self):
         page = create_page("page", "nav_playground.html", "en")
         page_content = self.get_pagecontent_obj(page)
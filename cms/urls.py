@@ -22,6 +22,7 @@ else:
 urlpatterns.extend([
     path('cms_login/', views.login, name='cms_login'),
     path('cms_wizard/', include('cms.wizards.urls')),
+    path('cms_plugin_fragment/<str:token>/', views.render_plugin_fragment, name='cms_plugin_fragment'),
     re_path(regexp, views.details, name='pages-details-by-slug'),
     path('', views.details, {'slug': ''}, name='pages-root'),
 ])
@@ -1,5 +1,6 @@
 import logging
 import sys
+import time
 import uuid
 
 # Py2 and Py3 compatible reload
@@ -9,15 +10,31 @@ from threading import local
 from django.conf import settings
 from django.urls import clear_url_caches
 
+from cms.utils.conf import get_cms_setting
+
 logger = logging.getLogger("cms")
 
 _urlconf_revision = {}
 _urlconf_revision_threadlocal = local()
 
+# When the global revision was last checked by this process, or by this
+# thread along with the local revision, see CMS_APPHOOK_REVISION_CHECK_INTERVAL.
+_last_revision_check = {}
+
 use_threadlocal = False
 
 
 def ensure_urlconf_is_up_to_date():
+    interval = get_cms_setting('APPHOOK_REVISION_CHECK_INTERVAL')
+
+    if interval:
+        now = time.monotonic()
+        last_check = get_last_revision_check()
+
+        if last_check is not None and now - last_check < interval / 1000:
+            return
+        set_last_revision_check(now)
+
     global_revision = get_global_revision()
     local_revision = get_local_revision()
 
@@ -52,19 +69,69 @@ def set_local_revision(revision):
         _urlconf_revision['urlconf_revision'] = revision
 
 
+def get_last_revision_check():
+    if use_threadlocal:
+        return getattr(_urlconf_revision_threadlocal, "last_check", None)
+    else:
+        return _last_revision_check.get('time')
+
+
+def set_last_revision_check(checked_at):
+    if use_threadlocal:
+        if checked_at is not None:
+            _urlconf_revision_threadlocal.last_check = checked_at
+        else:
+            if hasattr(_urlconf_revision_threadlocal, "last_check"):
+                del _urlconf_revision_threadlocal.last_check
+    else:
+        _last_revision_check['time'] = checked_at
+
+
+def _get_revision_cache_key():
+    prefix = get_cms_setting('CACHE_PREFIX')
+    return f'{prefix}urlconf_revision'
+
+
 def get_global_revision():
+    """
+    Returns the revision of the urlconf shared by all processes. With
+    CMS_APPHOOK_REVISION_CACHE, it's read from the cache, the database
+    only being queried on cache misses.
+    """
+    from django.core.cache import cache
+
     from ..models import UrlconfRevision
+
+    use_cache = get_cms_setting('APPHOOK_REVISION_CACHE')
+
+    if use_cache:
+        revision = cache.get(_get_revision_cache_key())
+
+        if revision is not None:
+            return revision
+
     revision, _ = UrlconfRevision.get_or_create_revision(
         revision=str(uuid.uuid4()))
+
+    if use_cache:
+        # Never overwrite a revision set meanwhile by set_global_revision()
+        cache.add(_get_revision_cache_key(), revision, None)
     return revision
 
 
 def set_global_revision(new_revision=None):
+    from django.core.cache import cache
+
     from ..models import UrlconfRevision
     if new_revision is None:
         new_revision = str(uuid.uuid4())
     UrlconfRevision.update_revision(new_revision)
 
+    if get_cms_setting('APPHOOK_REVISION_CACHE'):
+        cache.set(_get_revision_cache_key(), new_revision, None)
+    # This process checks the new revision right away
+    set_last_revision_check(None)
+
 
 def mark_urlconf_as_changed():
     new_revision = str(uuid.uuid4())
@@ -73,7 +140,13 @@ def mark_urlconf_as_changed():
 
 
 def reload_urlconf(urlconf=None, new_revision=None):
-    from cms.appresolver import clear_app_resolvers, get_app_patterns
+    from cms.appresolver import clear_app_resolvers, get_app_patterns, swap_app_resolvers
+
+    if urlconf is None and 'cms.urls' in sys.modules and get_cms_setting('APPHOOK_INCREMENTAL_RELOAD'):
+        swap_app_resolvers()
+        if new_revision is not None:
+            set_local_revision(new_revision)
+        return
 
     if 'cms.urls' in sys.modules:
         reload(sys.modules['cms.urls'])
@@ -60,8 +60,22 @@ DEFAULTS = {
     'PAGE_MEDIA_PATH': 'cms_page_media/',
     'TITLE_CHARACTER': '+',
     'PAGE_CACHE': True,
+    'PAGE_CACHE_STALE_WHILE_REVALIDATE': 0,
+    'PAGE_ROUTE_TABLE': False,
+    'APPHOOK_REVISION_CACHE': False,
+    'APPHOOK_REVISION_CHECK_INTERVAL': 0,
+    'APPHOOK_INCREMENTAL_RELOAD': False,
+    'PAGE_CACHE_COMPRESS': False,
+    'PAGE_CACHE_HOLES': False,
     'PLACEHOLDER_CACHE': True,
     'PLUGIN_CACHE': True,
+    'PLUGIN_FRAGMENT_CACHE': False,
+    'MATERIALIZED_PLACEHOLDERS': False,
+    'MENU_WINDOW': False,
+    'MENU_STALE_WHILE_REBUILD': 0,
+    'MENU_REBUILD_LOCK_WAIT': 1,
+    'MENU_FRAGMENT_CACHE': False,
+    'MENU_SHARED_BY_VISIBILITY': False,
     'CACHE_PREFIX': f'cms_{__version__}_',
     'PLUGIN_PROCESSORS': [],
     'PLUGIN_CONTEXT_PROCESSORS': [],
@@ -95,6 +95,12 @@ def get_page_from_request(request, use_path=None, clean_path=None):
             pass
 
     site = get_current_site()
+
+    if get_cms_setting('PAGE_ROUTE_TABLE'):
+        from cms.cache.routes import get_page_from_route_table
+
+        return get_page_from_route_table(site, path)
+
     page_urls = (
         PageUrl
         .objects
@@ -1,8 +1,9 @@
+import hashlib
 from functools import wraps
 
 from cms.cache.permissions import get_permission_cache, set_permission_cache
 from cms.constants import GRANT_ALL_PERMISSIONS
-from cms.models import Page, PermissionTuple
+from cms.models import Page, PermissionIndex, PermissionTuple
 from cms.utils import get_current_site
 from cms.utils.compat.dj import available_attrs
 from cms.utils.compat.warnings import RemovedInDjangoCMS43Warning
@@ -80,6 +81,39 @@ def _get_page_permission_tuples_for_action(user, site, action, check_global=True
     return page_actions[action]
 
 
+def _get_page_permission_index_for_action(user, site, action, check_global=True, use_cache=True):
+    """
+    Returns the permission tuples of the action compiled into a
+    PermissionIndex, cached along with them, or GRANT_ALL_PERMISSIONS.
+    """
+    if user.is_superuser or not get_cms_setting('PERMISSION'):
+        return GRANT_ALL_PERMISSIONS
+
+    if check_global and has_global_permission(user, site, action=action, use_cache=use_cache):
+        return GRANT_ALL_PERMISSIONS
+
+    cache_key = f'{action}_index'
+
+    if use_cache:
+        cached = get_permission_cache(user, cache_key)
+
+        if cached is not None:
+            return cached
+
+    perm_tuples = _get_page_permission_tuples_for_action(
+        user=user,
+        site=site,
+        action=action,
+        check_global=False,
+        use_cache=use_cache,
+    )
+    perm_index = PermissionIndex.compile(perm_tuples)
+
+    if use_cache:
+        set_permission_cache(user, cache_key, perm_index)
+    return perm_index
+
+
 def auth_permission_required(action):
     def decorator(func):
         @wraps(func, assigned=available_attrs(func))
@@ -352,6 +386,46 @@ def user_can_view_all_pages(user, site):
     return has_global_permission(user, site, action='view_page')
 
 
+@cached_func
+def get_page_visibility_fingerprint(user, site):
+    """
+    Returns a string identifying the pages of the «site» the authenticated
+    «user» can see. Users sharing a fingerprint see the same pages, see
+    cms.cms_menus.get_visible_page_contents().
+    """
+    from cms.models import PagePermission
+
+    cached = get_permission_cache(user, 'view_page_fingerprint') or {}
+
+    if site.pk in cached:
+        return cached[site.pk]
+
+    public_for = get_cms_setting('PUBLIC_FOR')
+    can_see_unrestricted = public_for == 'all' or (public_for == 'staff' and user.is_staff)
+
+    if user_can_view_all_pages(user, site):
+        fingerprint = 'all'
+    elif not get_cms_setting('PERMISSION'):
+        fingerprint = 'unrestricted' if can_see_unrestricted else 'none'
+    else:
+        # The view restrictions granting access to the user
+        restrictions = (
+            PagePermission
+            .objects
+            .with_user(user)
+            .filter(page__site=site, can_view=True)
+            .values_list('pk', flat=True)
+        )
+        restriction_ids = ','.join(str(pk) for pk in sorted(set(restrictions)))
+        fingerprint = '{}:{}'.format(
+            'unrestricted' if can_see_unrestricted else 'restricted',
+            hashlib.sha1(restriction_ids.encode('utf-8')).hexdigest(),
+        )
+    cached[site.pk] = fingerprint
+    set_permission_cache(user, 'view_page_fingerprint', cached)
+    return fingerprint
+
+
 def _perm_tuples_to_ids(perm_tuples):
     import inspect
     import warnings
@@ -539,20 +613,22 @@ def has_generic_permission(page, user, action, site=None, check_global=True, use
 
     page_path = page.node.path
     actions_map = {
-        'add_page': get_add_perm_tuples,
-        'change_page': get_change_perm_tuples,
-        'change_page_advanced_settings': get_change_advanced_settings_perm_tuples,
-        'change_page_permissions': get_change_permissions_perm_tuples,
-        'delete_page': get_delete_perm_tuples,
-        'delete_page_translation': get_delete_perm_tuples,
-        'publish_page': get_publish_perm_tuples,
-        'move_page': get_move_page_perm_tuples,
-        'view_page': get_view_perm_tuples,
+        'add_page': 'add_page',
+        'change_page': 'change_page',
+        'change_page_advanced_settings': 'change_page_advanced_settings',
+        'change_page_permissions': 'change_page_permissions',
+        'delete_page': 'delete_page',
+        'delete_page_translation': 'delete_page',
+        'publish_page': 'publish_page',
+        'move_page': 'move_page',
+        'view_page': 'view_page',
     }
 
-    func = actions_map[action]
-
-    page_perms = func(user, site, check_global=check_global, use_cache=use_cache)
-    return page_perms == GRANT_ALL_PERMISSIONS or any(
-        PermissionTuple(perm).contains(page_path) for perm in page_perms
+    perm_index = _get_page_permission_index_for_action(
+        user=user,
+        site=site,
+        action=actions_map[action],
+        check_global=check_global,
+        use_cache=use_cache,
     )
+    return perm_index == GRANT_ALL_PERMISSIONS or perm_index.contains(page_path)
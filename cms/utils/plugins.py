@@ -9,6 +9,7 @@ from operator import itemgetter
 from django.utils.encoding import force_str
 from django.utils.translation import gettext as _
 
+from cms.cache.holes import get_plugin_holes_mode
 from cms.exceptions import PluginLimitReached
 from cms.models.pluginmodel import CMSPlugin
 from cms.plugin_base import CMSPluginBase
@@ -415,6 +416,8 @@ def downcast_plugins(plugins,
 
     placeholders = placeholders or []
     placeholders_by_id = {placeholder.pk: placeholder for placeholder in placeholders}
+    # Uncacheable plugins left out of the page as holes don't prevent caching
+    punch_holes = bool(get_plugin_holes_mode(request))
 
     for plugin_type, pks in plugin_types_map.items():
         try:
@@ -439,7 +442,7 @@ def downcast_plugins(plugins,
             if placeholder:
                 instance.placeholder = placeholder
 
-                if not cls.cache and not cls().get_cache_expiration(request, instance, placeholder):
+                if not cls.cache and not punch_holes and not cls().get_cache_expiration(request, instance, placeholder):
                     placeholder.cache_placeholder = False
 
             plugin_lookup[instance.pk] = instance
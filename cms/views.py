@@ -16,14 +16,14 @@ from django.shortcuts import render
 from django.template.defaultfilters import title
 from django.template.response import TemplateResponse
 from django.urls import Resolver404, resolve, reverse
-from django.utils.cache import patch_cache_control
+from django.utils.cache import add_never_cache_headers
 from django.utils.http import url_has_allowed_host_and_scheme
-from django.utils.timezone import now
 from django.utils.translation import activate, get_language_from_request
 from django.views.decorators.http import require_POST
 
 from cms.apphook_pool import apphook_pool
-from cms.cache.page import get_page_cache
+from cms.cache.holes import get_plugin_hole_ids, render_plugin_hole
+from cms.cache.page import get_page_cache_response
 from cms.exceptions import LanguageError
 from cms.forms.login import CMSToolbarLoginForm
 from cms.models import Page, PageContent
@@ -64,22 +64,13 @@ def details(request, slug):
     page.
     """
     is_authenticated = request.user.is_authenticated
-    response_timestamp = now()
     if get_cms_setting("PAGE_CACHE") and (
         not hasattr(request, 'toolbar') or (
             not request.toolbar.edit_mode_active and not request.toolbar.show_toolbar and not is_authenticated
         )
     ):
-        cache_content = get_page_cache(request)
-        if cache_content is not None:
-            content, headers, expires_datetime = cache_content
-            response = HttpResponse(content)
-            response.xframe_options_exempt = True
-            response.headers = headers
-            # Recalculate the max-age header for this cached response
-            max_age = int(
-                (expires_datetime - response_timestamp).total_seconds() + 0.5)
-            patch_cache_control(response, max_age=max_age)
+        response = get_page_cache_response(request)
+        if response is not None:
             return response
 
     # Get a Page model object from the request
@@ -246,6 +237,22 @@ def login(request):
     return HttpResponseRedirect(redirect_to)
 
 
+def render_plugin_fragment(request, token):
+    """
+    Renders a single plugin left out of a cached page as a hole,
+    for ESI includes (see CMS_PAGE_CACHE_HOLES).
+    """
+    hole_ids = get_plugin_hole_ids(token)
+    content = render_plugin_hole(request, *hole_ids) if hole_ids else None
+
+    if content is None:
+        raise Http404('Plugin not found')
+
+    response = HttpResponse(content)
+    add_never_cache_headers(response)
+    return response
+
+
 def render_object_structure(request, content_type_id, object_id):
     try:
         content_type = ContentType.objects.get_for_id(content_type_id)
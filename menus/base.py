@@ -176,6 +176,26 @@ class NavigationNode:
         node_abs_url = self.get_absolute_url()
         return node_abs_url == request.path
 
+    def get_selection_key(self) -> Any:
+        """
+        Returns the key the node is selected by, so that the selected node of
+        a menu is found without calling :meth:`is_selected` on every node.
+
+        The node is selected for the requests whose
+        :meth:`get_request_selection_key` equals this key. Subclasses
+        overriding :meth:`is_selected` should override both methods along
+        with it, :meth:`is_selected` being called on their nodes otherwise.
+        """
+        return self.get_absolute_url()
+
+    @classmethod
+    def get_request_selection_key(cls, request) -> Any:
+        """
+        Returns the key of the nodes selected for the request, or None if no
+        node is, see :meth:`get_selection_key`.
+        """
+        return request.path
+
 
     @property
     def is_leaf_node(self) -> bool:
@@ -1,3 +1,6 @@
+import hashlib
+import time
+from collections import Counter
 from functools import partial
 from logging import getLogger
 
@@ -13,6 +16,8 @@ from django.utils.translation import (
     gettext_lazy as _,
 )
 
+from cms.cache import invalidate_cms_page_cache_dependencies
+from cms.cache.routes import invalidate_page_routes
 from cms.utils import get_current_site
 from cms.utils.conf import get_cms_setting
 from cms.utils.i18n import (
@@ -21,63 +26,144 @@ from cms.utils.i18n import (
 )
 from menus.base import Menu
 from menus.exceptions import NamespaceAlreadyRegistered
-from menus.models import CacheKey
+from menus.tree import NodeTree
 
 logger = getLogger('menus')
 
+# Per-process counters of menu tree lookups: "hit", "rebuild", "stale"
+# (served while another worker rebuilds) and "wait" (waited for another
+# worker to rebuild), along with the time spent in seconds in
+# "rebuild_time" and "wait_time".
+menu_cache_stats = Counter()
 
-def _build_nodes_inner_for_one_menu(nodes, menu_class_name):
+# Interval in seconds at which a waiting worker checks whether the tree
+# has been rebuilt.
+MENU_REBUILD_POLL_INTERVAL = 0.05
+
+# Part of the cache keys, to be bumped whenever the layout of the cached
+# trees changes, so that trees written by earlier releases are never read.
+MENU_TREE_FORMAT = 't2'
+
+
+def _get_menu_version_key(site_id=None, language=None):
     """
-    This is an easier to test "inner loop" building the menu tree structure
-    for one menu (one language, one site)
+    Returns the cache key holding the version of the menu namespace of
+    «site_id» and «language». None stands for all sites or all languages.
     """
-    done_nodes = {}  # Dict of node.id:Node
-    final_nodes = []
+    prefix = get_cms_setting('CACHE_PREFIX')
+    return f"{prefix}menu_nodes_version_{site_id or '*'}_{language or '*'}"
+
+
+def _get_menu_registry_key():
+    prefix = get_cms_setting('CACHE_PREFIX')
+    return f"{prefix}menu_registry_version"
+
+
+def _get_menu_versions(site_id, language):
+    """
+    Returns the versions of all the menu namespaces covering «site_id» and
+    «language», with a single cache round-trip. Namespaces without a version
+    in the cache get a fresh one.
+    """
+    keys = [
+        _get_menu_version_key(),
+        _get_menu_version_key(site_id=site_id),
+        _get_menu_version_key(language=language),
+        _get_menu_version_key(site_id, language),
+    ]
+    versions = cache.get_many(keys)
+    missing = {key: int(time.time() * 1000000) for key in keys if key not in versions}
+
+    if missing:
+        # Should a version expire before the menus cached against it,
+        # these are simply rebuilt.
+        cache.set_many(missing, get_cms_setting('CACHE_DURATIONS')['menus'])
+        versions.update(missing)
+    return [versions[key] for key in keys]
 
-    # This is to prevent infinite loops - we need to compare the number of
-    # times we see a specific node to "something", and for the time being,
-    # it's the total number of nodes
-    list_total_length = len(nodes)
 
-    while nodes:
-        # For when the node has a parent_id but we haven't seen it yet.
-        # We must not append it to the final list in this case!
-        should_add_to_final_list = True
+def _build_nodes_inner_for_one_menu(nodes, menu_class_name):
+    """
+    This is an easier to test "inner loop" building the menu tree structure
+    for one menu (one language, one site)
 
-        node = nodes.pop(0)
+    Nodes are returned in list order, except that nodes listed before their
+    parent are moved after it, as if the list was scanned again for them.
+    Nodes whose parent can't be found, directly or through their ancestors,
+    are left out.
 
-        # Increment the "seen" counter for this specific node.
-        node._counter = getattr(node, '_counter', 0) + 1
+    Runs in linear time: the nodes are indexed by (namespace, id) in one pass,
+    then linked to their parents in a second pass.
+    """
+    parent_positions = []
+    positions_by_key = {}
 
+    for position, node in enumerate(nodes):
         # Implicit namespacing by menu.__name__
         if not node.namespace:
             node.namespace = menu_class_name
-        if node.namespace not in done_nodes:
-            # We need to create the namespace dict to avoid KeyErrors
-            done_nodes[node.namespace] = {}
-
-        # If we have seen the parent_id already...
-        if node.parent_id in done_nodes[node.namespace]:
-            # Implicit parent namespace by menu.__name__
-            if not node.parent_namespace:
-                node.parent_namespace = menu_class_name
-            parent = done_nodes[node.namespace][node.parent_id]
-            parent.children.append(node)
-            node.parent = parent
-        # If it has a parent_id but we haven't seen it yet...
-        elif node.parent_id:
-            # We check for infinite loops here, by comparing the number of
-            # times we "saw" this node to the number of nodes in the list
-            if node._counter < list_total_length:
-                nodes.append(node)
-            # Never add this node to the final list until it has a real
-            # parent (node.parent)
-            should_add_to_final_list = False
-
-        if should_add_to_final_list:
+        # If several nodes share an id, the last one listed before the node
+        # is its parent, if any, like for nodes listed after their parent.
+        parent_positions.append(positions_by_key.get((node.namespace, node.parent_id)))
+        positions_by_key[(node.namespace, node.id)] = position
+
+    # The pass over the list in which each node would be accepted:
+    # the pass of its parent, or the next one if the parent comes after the node.
+    # None marks the nodes without a (valid) parent.
+    passes = [None] * len(nodes)
+    resolved = [False] * len(nodes)
+
+    for position in range(len(nodes)):
+        chain = []
+        in_chain = set()
+        current = position
+
+        while not resolved[current]:
+            node = nodes[current]
+            parent_position = parent_positions[current]
+
+            if parent_position is None and node.parent_id:
+                parent_position = positions_by_key.get((node.namespace, node.parent_id))
+                parent_positions[current] = parent_position
+
+            if not node.parent_id and parent_position is None:
+                passes[current] = 0
+                resolved[current] = True
+            elif parent_position is None or current in in_chain:
+                # Unknown parent or circular dependency
+                resolved[current] = True
+            else:
+                chain.append(current)
+                in_chain.add(current)
+                current = parent_position
+
+        for child in reversed(chain):
+            parent_pass = passes[parent_positions[child]]
+
+            if parent_pass is not None:
+                passes[child] = parent_pass + (parent_positions[child] > child)
+            resolved[child] = True
+
+    final_nodes = []
+    nodes_by_pass = {}
+
+    for position, node in enumerate(nodes):
+        if passes[position] is not None:
+            nodes_by_pass.setdefault(passes[position], []).append(position)
+
+    for pass_number in sorted(nodes_by_pass):
+        for position in nodes_by_pass[pass_number]:
+            node = nodes[position]
+            parent_position = parent_positions[position]
+
+            if parent_position is not None:
+                # Implicit parent namespace by menu.__name__
+                if not node.parent_namespace:
+                    node.parent_namespace = menu_class_name
+                parent = nodes[parent_position]
+                parent.children.append(node)
+                node.parent = parent
             final_nodes.append(node)
-            # add it to the "seen" list
-            done_nodes[node.namespace][node.id] = node
     return final_nodes
 
 
@@ -105,7 +191,13 @@ class MenuRenderer:
         # because we need to make sure that a menu renderer
         # points to the same registered menus as long as the
         # instance lives.
-        self.menus = pool.get_registered_menus(for_rendering=True)
+        compiled = pool.get_compiled_menus()
+        self.menus = {name: menu_cls for name, (menu_cls, instance_id) in compiled.items()}
+        # Attached menus are bound to their instance when built, see get_menu()
+        self._menu_instance_ids = {
+            name: instance_id for name, (menu_cls, instance_id) in compiled.items() if instance_id is not None
+        }
+        self._menu_instances = {}
         self.request = request
         self.request_language = None
         if is_language_prefix_patterns_used():
@@ -115,30 +207,79 @@ class MenuRenderer:
         self.site = Site.objects.get_current(request)
         toolbar = getattr(request, "toolbar", None)
         self.edit_or_preview = toolbar.edit_mode_active or toolbar.preview_mode_active if toolbar else False
+        # With CMS_MENU_WINDOW, menus may only build the part of their tree
+        # around the current page, see window_page.
+        self.windowed = bool(get_cms_setting('MENU_WINDOW')) and not self.edit_or_preview
+        # Set while building the nodes of a breadcrumb, menus may then only
+        # build the ancestors of the current page, see _build_node_tree().
+        self.breadcrumb_only = False
+        self._node_tree = None
+
+    @cached_property
+    def window_page(self):
+        """
+        Returns the page the menus are built around in windowed mode, or None
+        if the request has no current page.
+        """
+        page = getattr(self.request, 'current_page', None)
+        return page if page else None
+
+    @cached_property
+    def _menu_versions(self):
+        return _get_menu_versions(self.site.pk, self.request_language)
+
+    @cached_property
+    def _cache_key_base(self):
+        from cms.utils.page_permissions import get_page_visibility_fingerprint
 
-    @property
-    def cache_key(self):
         prefix = get_cms_setting('CACHE_PREFIX')
 
-        key = f"{prefix}menu_nodes_{self.request_language}_{self.site.pk}"
+        key = f"{prefix}menu_tree_{MENU_TREE_FORMAT}_{self.request_language}_{self.site.pk}"
+
+        shared = get_cms_setting('MENU_SHARED_BY_VISIBILITY') and not self.edit_or_preview
 
-        if self.request.user.is_authenticated:
+        if self.request.user.is_authenticated and shared:
+            # Users who can see the same pages share the same menu
+            fingerprint = get_page_visibility_fingerprint(self.request.user, self.site)
+            key += f"_{fingerprint}_visibility"
+        elif self.request.user.is_authenticated:
             key += f"_{self.request.user.pk}_user"
 
         if self.edit_or_preview:
             key += ':edit'
         else:
             key += ':public'
+
+        if self.windowed:
+            key += f":window_{self.window_page.pk if self.window_page else ''}"
         return key
 
     @cached_property
-    def is_cached(self):
-        db_cache_key_lookup = CacheKey.objects.filter(
-            key=self.cache_key,
-            language=self.request_language,
-            site=self.site.pk,
-        )
-        return db_cache_key_lookup.exists()
+    def cache_key(self):
+        # The key changes whenever the menus of the site and language are
+        # invalidated, see MenuPool.clear().
+        return self._cache_key_base + ':' + '.'.join(str(version) for version in self._menu_versions)
+
+    def get_fragment_cache_key(self, *args):
+        """
+        Returns the key the output of a menu template tag is cached under,
+        «args» being the name and arguments of the tag, or None if the output
+        is not to be cached, see CMS_MENU_FRAGMENT_CACHE.
+
+        The output is only cached for anonymous visitors. It's cached per
+        path and current page, as these select the nodes of the menus.
+        """
+        user = getattr(self.request, 'user', None)
+
+        if not get_cms_setting('MENU_FRAGMENT_CACHE') or self.edit_or_preview:
+            return None
+
+        if user is None or user.is_authenticated:
+            return None
+
+        page = getattr(self.request, 'current_page', None)
+        fragment = repr((args, self.request.path, page.pk if page else None))
+        return f"{self.cache_key}:fragment_{hashlib.sha1(fragment.encode('utf-8')).hexdigest()}"
 
     def _build_nodes(self):
         """
@@ -157,23 +298,104 @@ class MenuRenderer:
             else:
                 the node is put at the bottom of the list
         """
-        key = self.cache_key
+        return self._build_node_tree()[0]
+
+    def _build_node_tree(self, breadcrumb=False):
+        """
+        Returns the list of nodes of all menus along with their NodeTree,
+        from the cache if possible.
+
+        With «breadcrumb», the menus of a public page are only built for its
+        breadcrumb: the CMS menu then only holds the home page and the
+        ancestors of the current page.
+
+        With CMS_MENU_STALE_WHILE_REBUILD set, a single worker rebuilds
+        outdated menus, holding a cache-backed lock. Meanwhile, the others
+        serve the latest menus built, if outdated for no longer than the
+        setting, or wait up to CMS_MENU_REBUILD_LOCK_WAIT seconds for the
+        rebuild to complete before rebuilding the menus themselves.
+        """
+        breadcrumb_only = breadcrumb and not self.edit_or_preview and self.window_page is not None
+        suffix = f":breadcrumb_{self.window_page.pk}" if breadcrumb_only else ''
+        key = self.cache_key + suffix
+        # The latest menus built, regardless of their version
+        latest_key = self._cache_key_base + ':latest' + suffix
+        grace = get_cms_setting('MENU_STALE_WHILE_REBUILD')
+
+        cached = cache.get(key, None)
+
+        if cached:
+            menu_cache_stats['hit'] += 1
+            self._node_tree = cached
+            return cached
 
-        cached_nodes = cache.get(key, None)
+        if not grace:
+            return self._rebuild_node_tree(key, breadcrumb_only)
 
-        if cached_nodes and self.is_cached:
-            # Only use the cache if the key is present in the database.
-            # This prevents a condition where keys which have been removed
-            # from the database due to a change in content, are still used.
-            return cached_nodes
+        lock_key = latest_key + '.lock'
 
+        if cache.add(lock_key, True, grace):
+            try:
+                return self._rebuild_node_tree(key, breadcrumb_only, latest_key=latest_key)
+            finally:
+                cache.delete(lock_key)
+
+        latest = cache.get(latest_key)
+
+        if latest and self._is_servable_while_stale(latest[0], grace):
+            menu_cache_stats['stale'] += 1
+            self._node_tree = latest[1]
+            return self._node_tree
+
+        # No menus to serve meanwhile, wait for the other worker
+        menu_cache_stats['wait'] += 1
+        started = time.monotonic()
+        deadline = started + get_cms_setting('MENU_REBUILD_LOCK_WAIT')
+
+        try:
+            while True:
+                cached = cache.get(key, None)
+
+                if cached:
+                    self._node_tree = cached
+                    return cached
+
+                if time.monotonic() >= deadline or not cache.get(lock_key):
+                    break
+                time.sleep(MENU_REBUILD_POLL_INTERVAL)
+        finally:
+            menu_cache_stats['wait_time'] += time.monotonic() - started
+        return self._rebuild_node_tree(key, breadcrumb_only, latest_key=latest_key)
+
+    def _is_servable_while_stale(self, built_at, grace):
+        """
+        Returns True if menus built at «built_at» have been outdated,
+        be it expired or invalidated, for no longer than «grace» seconds.
+        """
+        outdated_at = built_at + get_cms_setting('CACHE_DURATIONS')['menus']
+        invalidated_at = max(self._menu_versions) / 1000000
+
+        if invalidated_at > built_at:
+            outdated_at = min(outdated_at, invalidated_at)
+        return time.time() - outdated_at <= grace
+
+    def _rebuild_node_tree(self, key, breadcrumb_only, latest_key=None):
+        """
+        Builds the nodes of all menus along with their NodeTree and caches
+        them under «key», as well as under «latest_key» if given.
+        """
+        started = time.monotonic()
         final_nodes = []
         toolbar = getattr(self.request, 'toolbar', None)
 
         for menu_class_name in self.menus:
             menu = self.get_menu(menu_class_name)
 
+            if menu is None:
+                continue
+
             try:
+                self.breadcrumb_only = breadcrumb_only
                 nodes = menu.get_nodes(self.request)
             except NoReverseMatch:
                 # Apps might raise NoReverseMatch if an apphook does not yet
@@ -186,26 +408,51 @@ class MenuRenderer:
                         menu_class_name
                     )
                 logger.error("Menu %s could not be loaded." % menu_class_name, exc_info=True)
+            finally:
+                self.breadcrumb_only = False
             # nodes is a list of navigation nodes (page tree in cms + others)
             final_nodes += _build_nodes_inner_for_one_menu(nodes, menu_class_name)
 
-        cache.set(key, final_nodes, get_cms_setting('CACHE_DURATIONS')['menus'])
+        self._node_tree = (final_nodes, NodeTree(final_nodes))
+        duration = get_cms_setting('CACHE_DURATIONS')['menus']
+        cache.set(key, self._node_tree, duration)
+
+        if latest_key:
+            # Kept past its expiration to be served while stale
+            grace = get_cms_setting('MENU_STALE_WHILE_REBUILD')
+            cache.set(latest_key, (time.time(), self._node_tree), duration + grace)
 
-        if not self.is_cached:
-            # No need to invalidate the internal lookup cache,
-            # just set the value directly.
-            self.__dict__['is_cached'] = True
-            # We need to have a list of the cache keys for languages and sites that
-            # span several processes - so we follow the Django way and share through
-            # the database. It's still cheaper than recomputing every time!
-            # This way we can selectively invalidate per-site and per-language,
-            # since the cache is shared but the keys aren't
-            CacheKey.objects.create(key=key, language=self.request_language, site=self.site.pk)
-        return final_nodes
+        elapsed = time.monotonic() - started
+        menu_cache_stats['rebuild'] += 1
+        menu_cache_stats['rebuild_time'] += elapsed
+        logger.debug("Menus rebuilt in %.3fs for %s", elapsed, key)
+        return self._node_tree
 
     def _mark_selected(self, nodes):
         """Mark the selected node and its ancestors, descendants and siblings."""
+        if self._node_tree and nodes is self._node_tree[0]:
+            # The nodes are the ones just built or loaded from the cache, the
+            # selected node is looked up and their tree walked through the index.
+            tree = self._node_tree[1]
+            position = tree.get_selected(nodes, self.request)
+
+            if position is None:
+                return nodes
+
+            nodes[position].selected = True
+
+            for ancestor in tree.get_ancestors(position):
+                nodes[ancestor].ancestor = True
+
+            for descendant in tree.get_descendants(position):
+                nodes[descendant].descendant = True
+
+            for sibling in tree.get_siblings(position):
+                nodes[sibling].sibling = True
+            return nodes
+
         selected = next((node for node in nodes if node.is_selected(self.request)), None)
+
         if selected:
             selected.selected = True
             self._mark_ancestors(selected)
@@ -251,7 +498,7 @@ class MenuRenderer:
         return nodes
 
     def get_nodes(self, namespace=None, root_id=None, breadcrumb=False):
-        nodes = self._build_nodes()
+        nodes = self._build_node_tree(breadcrumb=breadcrumb)[0]
         nodes = self.apply_modifiers(
             nodes=nodes,
             namespace=namespace,
@@ -262,9 +509,33 @@ class MenuRenderer:
         return nodes
 
     def get_menu(self, menu_name):
+        """
+        Returns the menu registered as «menu_name», bound to its instance if
+        it's an attached menu, or None if that instance no longer exists.
+        """
         MenuClass = self.menus[menu_name]
+        instance_id = self._menu_instance_ids.get(menu_name)
+
+        if instance_id is not None:
+            instance = self._get_menu_instances(MenuClass).get(instance_id)
+
+            if instance is None:
+                return None
+            MenuClass = _get_menu_class_for_instance(MenuClass, instance)
         return MenuClass(renderer=self)
 
+    def _get_menu_instances(self, menu_cls):
+        """
+        Returns the instances «menu_cls» is attached to by pk, loaded with a
+        single query once per renderer.
+        """
+        if menu_cls not in self._menu_instances:
+            instance_ids = [
+                instance_id for name, instance_id in self._menu_instance_ids.items() if self.menus[name] is menu_cls
+            ]
+            self._menu_instances[menu_cls] = menu_cls.get_instances().in_bulk(instance_ids)
+        return self._menu_instances[menu_cls]
+
 
 class MenuPool:
 
@@ -272,6 +543,8 @@ class MenuPool:
         self.menus = {}
         self.modifiers = []
         self.discovered = False
+        # (version, menus, apps, compiled menus), see get_compiled_menus()
+        self._compiled_menus = None
 
     def get_renderer(self, request):
         self.discover_menus()
@@ -335,23 +608,94 @@ class MenuPool:
                     "Something was registered as a menu, but isn't.")
         return registered_menus
 
+    def get_compiled_menus(self):
+        """
+        Returns the menus to render, as get_registered_menus(for_rendering=True)
+        does, but compiled once per process. The menus are compiled again
+        once the pages menus can be attached to have changed, see
+        clear_registry(), or once other menus or apphooks are registered.
+
+        Menus are returned as (menu class, pk of the instance it's attached
+        to or None) tuples, so that no instance outlives a request.
+
+        The returned dict is shared and must not be changed.
+        """
+        from cms.apphook_pool import apphook_pool
+
+        self.discover_menus()
+        key = _get_menu_registry_key()
+        version = cache.get(key)
+
+        if version is None:
+            version = int(time.time() * 1000000)
+            cache.set(key, version, get_cms_setting('CACHE_DURATIONS')['menus'])
+
+        compiled = self._compiled_menus
+
+        if (
+            compiled
+            and compiled[0] == version
+            and compiled[1] is self.menus
+            and compiled[2] is apphook_pool.apps
+        ):
+            return compiled[3]
+
+        menus = self._compile_menus()
+        self._compiled_menus = (version, self.menus, apphook_pool.apps, menus)
+        return menus
+
+    def _compile_menus(self):
+        menus = {}
+
+        for menu_class_name, menu_cls in self.get_registered_menus(for_rendering=True).items():
+            instance = getattr(menu_cls, 'instance', None)
+
+            if instance is not None:
+                # Attached menus are kept as the class they were bound from,
+                # see _get_menu_class_for_instance()
+                menus[menu_class_name] = (menu_cls.__bases__[0], instance.pk)
+            else:
+                menus[menu_class_name] = (menu_cls, None)
+        return menus
+
+    def clear_registry(self):
+        """
+        Makes all processes compile their menus again, see get_compiled_menus().
+        To be called whenever pages get or lose an apphook or a navigation
+        extender.
+        """
+        cache.set(_get_menu_registry_key(), int(time.time() * 1000000), get_cms_setting('CACHE_DURATIONS')['menus'])
+
     def get_registered_modifiers(self):
         return self.modifiers
 
-    def clear(self, site_id=None, language=None, all=False):
+    def clear(self, site_id=None, language=None, all=False, page_cache=True):
         """
         This invalidates the cache for a given menu (site_id and language)
+        and the cached pages depending on it, as well as the page routes.
+
+        Clearing the menus of all sites invalidates the cached pages depending
+        on the menu of each site. With «page_cache» False, e.g. when users or
+        groups change, cached pages are left untouched: they are only served
+        to anonymous visitors.
         """
-        if all:
-            cache_keys = CacheKey.objects.get_keys()
-        else:
-            cache_keys = CacheKey.objects.get_keys(site_id, language)
+        if get_cms_setting('PAGE_CACHE') and page_cache:
+            if site_id and not all:
+                site_ids = [site_id]
+            else:
+                site_ids = Site.objects.values_list('pk', flat=True)
+            invalidate_cms_page_cache_dependencies([('menu', pk) for pk in site_ids])
 
-        to_be_deleted = cache_keys.distinct().values_list('key', flat=True)
+        # Publishing content clears the menus, but might not save pages
+        invalidate_page_routes()
 
-        if to_be_deleted:
-            cache.delete_many(to_be_deleted)
-            cache_keys.delete()
+        # Rather than tracking and deleting the cached menus, the version of
+        # their namespace is bumped. Outdated menus are left to expire.
+        if all:
+            key = _get_menu_version_key()
+        else:
+            key = _get_menu_version_key(site_id, language)
+        cache.set(key, int(time.time() * 1000000), get_cms_setting('CACHE_DURATIONS')['menus'])
 
     def register_menu(self, menu_cls):
         from menus.base import Menu
@@ -361,6 +705,7 @@ class MenuPool:
                 f"[{menu_cls.__name__}] a menu with this name is already registered")
         # Note: menu_cls should still be the menu CLASS at this point.
         self.menus[menu_cls.__name__] = menu_cls
+        self._compiled_menus = None
 
     def register_modifier(self, modifier_class):
         from menus.base import Modifier
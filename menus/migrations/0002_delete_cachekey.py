@@ -0,0 +1,27 @@
+from django.core.cache import cache
+from django.db import migrations
+
+
+def forwards(apps, schema_editor):
+    # Menus are now cached under versioned keys, drop the entries
+    # tracked in the database before retiring the table.
+    db_alias = schema_editor.connection.alias
+    CacheKey = apps.get_model('menus', 'CacheKey')
+    keys = list(CacheKey.objects.using(db_alias).values_list('key', flat=True).distinct())
+
+    for chunk_start in range(0, len(keys), 1000):
+        cache.delete_many(keys[chunk_start:chunk_start + 1000])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menus', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='CacheKey',
+        ),
+    ]
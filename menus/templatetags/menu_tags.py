@@ -5,10 +5,12 @@ from classytags.core import Options
 from classytags.helpers import InclusionTag
 from django import template
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.urls import NoReverseMatch, reverse
 from django.utils.encoding import force_str
 from django.utils.translation import get_language, gettext
 
+from cms.utils.conf import get_cms_setting
 from cms.utils.i18n import (
     force_language,
     get_language_list,
@@ -104,8 +106,39 @@ def flatten(nodes):
     return flat
 
 
+class MenuFragmentCacheMixin:
+    """
+    Caches the output of the tag for anonymous visitors,
+    see MenuRenderer.get_fragment_cache_key().
+    """
+
+    def render_tag(self, context, **kwargs):
+        request = context.get('request')
+
+        if not request or kwargs.get('next_page') or not get_cms_setting('MENU_FRAGMENT_CACHE'):
+            return super().render_tag(context, **kwargs)
+
+        menu_renderer = context.get('cms_menu_renderer')
+
+        if not menu_renderer:
+            menu_renderer = menu_pool.get_renderer(request)
+
+        key = menu_renderer.get_fragment_cache_key(self.name, sorted(kwargs.items()))
+
+        if key is None:
+            return super().render_tag(context, **kwargs)
+
+        output = cache.get(key)
+
+        if output is None:
+            with context.push(cms_menu_renderer=menu_renderer):
+                output = super().render_tag(context, **kwargs)
+            cache.set(key, output, get_cms_setting('CACHE_DURATIONS')['menus'])
+        return output
+
+
 @register.tag(name="show_menu")
-class ShowMenu(InclusionTag):
+class ShowMenu(MenuFragmentCacheMixin, InclusionTag):
     """
     render a nested list of all children of the pages
     - from_level: starting level
@@ -190,7 +223,7 @@ class ShowMenuBelowId(ShowMenu):
 
 
 @register.tag(name="show_sub_menu")
-class ShowSubMenu(InclusionTag):
+class ShowSubMenu(MenuFragmentCacheMixin, InclusionTag):
     """
     show the sub menu of the current nav-node.
     - levels: how many levels deep
@@ -263,7 +296,7 @@ class ShowSubMenu(InclusionTag):
 
 
 @register.tag(name="show_breadcrumb")
-class ShowBreadcrumb(InclusionTag):
+class ShowBreadcrumb(MenuFragmentCacheMixin, InclusionTag):
     """
     Shows the breadcrumb from the node that has the same url as the current request
 
@@ -0,0 +1,177 @@
+from array import array
+from functools import lru_cache
+
+SELECTION_METHODS = ('is_selected', 'get_selection_key', 'get_request_selection_key')
+
+
+@lru_cache
+def get_selection_class(node_class):
+    """
+    Returns the class defining how the nodes of «node_class» are selected,
+    or None if it overrides is_selected() alone, without selection keys.
+    """
+    owners = {
+        next(klass for klass in node_class.__mro__ if name in vars(klass))
+        for name in SELECTION_METHODS
+    }
+    return owners.pop() if len(owners) == 1 else None
+
+
+class NodeTree:
+    """
+    Compact index of a menu tree, as built by MenuRenderer._build_nodes().
+
+    The structure of the tree is kept in parallel arrays indexed by the
+    position of the nodes in the node list, so that it can be walked without
+    following the links between the NavigationNode objects. It's pickled
+    along with the nodes and only describes them as long as no modifier has
+    changed the tree.
+
+    Attributes:
+        parents: The position of the parent of each node, -1 for root nodes.
+        levels: The depth of each node, 0 for root nodes.
+        preorder: The positions of the nodes in tree order.
+        ranks: The index of each node in ``preorder``.
+        ends: The index in ``preorder`` after the last descendant of each node.
+        first_children: The position of the first child of each node, -1 for
+            leaf nodes.
+        next_siblings: The position of the next child of the same parent,
+            -1 for the last one.
+        roots: The positions of the root nodes.
+        selection: The position of the first node of each selection key, by
+            the class defining the key, see NavigationNode.get_selection_key().
+        unindexed: The positions of the nodes only is_selected() can tell
+            are selected.
+    """
+
+    def __init__(self, nodes):
+        positions = {id(node): position for position, node in enumerate(nodes)}
+        count = len(nodes)
+
+        self.parents = array('l', [-1]) * count
+        self.levels = array('l', [0]) * count
+        self.preorder = array('l')
+        self.ranks = array('l', [0]) * count
+        self.ends = array('l', [0]) * count
+        self.first_children = array('l', [-1]) * count
+        self.next_siblings = array('l', [-1]) * count
+        self.roots = array('l')
+        self.selection = {}
+        self.unindexed = array('l')
+        last_children = array('l', [-1]) * count
+
+        for position, node in enumerate(nodes):
+            self._index_selection(position, node)
+            parent = positions.get(id(node.parent), -1) if node.parent else -1
+            self.parents[position] = parent
+
+            if parent == -1:
+                self.roots.append(position)
+            elif last_children[parent] == -1:
+                self.first_children[parent] = last_children[parent] = position
+            else:
+                self.next_siblings[last_children[parent]] = last_children[parent] = position
+
+        # Walk the tree depth-first with an explicit stack, deep trees
+        # would otherwise exceed the recursion limit.
+        for root in self.roots:
+            stack = [root]
+
+            while stack:
+                position = stack.pop()
+
+                if position < 0:
+                    # All descendants of the node have been visited
+                    self.ends[~position] = len(self.preorder)
+                    continue
+
+                parent = self.parents[position]
+                self.levels[position] = self.levels[parent] + 1 if parent != -1 else 0
+                self.ranks[position] = len(self.preorder)
+                self.preorder.append(position)
+                stack.append(~position)
+                stack.extend(reversed(self.get_children(position)))
+
+    def __len__(self):
+        return len(self.parents)
+
+    def _index_selection(self, position, node):
+        selection_class = get_selection_class(type(node))
+
+        if selection_class is None:
+            self.unindexed.append(position)
+            return
+
+        try:
+            self.selection.setdefault(selection_class, {}).setdefault(node.get_selection_key(), position)
+        except TypeError:
+            # Unhashable key
+            self.unindexed.append(position)
+
+    def get_selected(self, nodes, request):
+        """
+        Returns the position of the first of the «nodes» selected for the
+        request, or None. Only the nodes without selection key are checked
+        with is_selected().
+        """
+        selected = None
+
+        for selection_class, positions in self.selection.items():
+            key = selection_class.get_request_selection_key(request)
+
+            try:
+                position = positions.get(key) if key is not None else None
+            except TypeError:
+                position = None
+
+            if position is not None and (selected is None or position < selected):
+                selected = position
+
+        for position in self.unindexed:
+            if selected is not None and position > selected:
+                break
+
+            if nodes[position].is_selected(request):
+                return position
+        return selected
+
+    def get_children(self, position):
+        """
+        Returns the positions of the children of the node.
+        """
+        children = []
+        position = self.first_children[position]
+
+        while position != -1:
+            children.append(position)
+            position = self.next_siblings[position]
+        return children
+
+    def get_ancestors(self, position):
+        """
+        Returns the positions of the ancestors of the node, nearest first.
+        """
+        ancestors = []
+        position = self.parents[position]
+
+        while position != -1:
+            ancestors.append(position)
+            position = self.parents[position]
+        return ancestors
+
+    def get_descendants(self, position):
+        """
+        Returns the positions of the descendants of the node, in tree order.
+        """
+        return self.preorder[self.ranks[position] + 1:self.ends[position]]
+
+    def get_siblings(self, position):
+        """
+        Returns the positions of the siblings of the node, all other root
+        nodes for a root node.
+        """
+        parent = self.parents[position]
+
+        if parent == -1:
+            return [root for root in self.roots if root != position]
+        return [sibling for sibling in self.get_children(parent) if sibling != position]